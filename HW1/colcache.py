@@ -0,0 +1,155 @@
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+
+# Spaltenorientierter Client-Cache über die Wertetabellen {v}_{typ} und {v}_null: sortiertes
+# oid-Array plus ein Segment pro Attribut (Validitäts-Bitmap über die oid-Positionen,
+# CSR-artig die Positionen der Nicht-NULL-Werte und die Werte selbst; Typen fester Breite
+# in einem array, alle anderen als Text in Offsets + UTF-8-Puffer).
+# Segmente werden bei Bedarf geladen und per LRU verdrängt, sobald max_bytes überschritten ist.
+# Momentaufnahme: spätere Schreibzugriffe auf v sieht der Cache nicht.
+
+
+# Typcode des arrays je Typ fester Breite
+fixed_types = {"int": "i", "big": "q", "dbl": "d", "bol": "b"}
+# Rückwandlung der Textform für die übrigen Typen
+text_types = {
+    "str": str,
+    "dat": date.fromisoformat,
+    "tsp": datetime.fromisoformat,
+    "num": Decimal,
+}
+
+
+# columns: Spalte -> (Typ, key_id) und types: vorhandene Wertetabellen, wie sie
+# phase2.get_v_columns/get_v_types für v_table_name liefern
+def create_cache(cursor, v_table_name, columns, types, max_bytes=64 * 2**20):
+    columns = dict(sorted(columns.items()))
+    cursor.execute(
+        " UNION ".join(f"SELECT oid FROM {v_table_name}_{s}" for s in [*types, "null"])
+        + " ORDER BY oid"
+    )
+    oids = array("i", (oid for [oid] in cursor.fetchall()))
+    return {
+        "v": v_table_name,
+        "oids": oids,
+        "columns": columns,
+        "segments": OrderedDict(),  # Spalte -> Segment, älteste Nutzung zuerst
+        "max_bytes": max_bytes,
+        "bytes": oids.itemsize * len(oids),
+        "hits": 0,
+        "misses": 0,
+    }
+
+
+def segment_size(segment):
+    return sum(
+        len(part) * getattr(part, "itemsize", 1)
+        for key, part in segment.items()
+        if key != "type"
+    )
+
+
+def load_segment(cursor, cache, column):
+    data_type, key_id = cache["columns"][column]
+    cursor.execute(
+        f"SELECT oid, value FROM {cache['v']}_{data_type} WHERE key = %s ORDER BY oid",
+        (key_id,),
+    )
+    oids = cache["oids"]
+    valid = bytearray((len(oids) + 7) // 8)
+    positions = array("i")
+    segment = {"type": data_type, "valid": valid, "positions": positions}
+    if data_type in fixed_types:
+        values = segment["values"] = array(fixed_types[data_type])
+    else:
+        offsets = segment["offsets"] = array("I", [0])
+        buffer = segment["buffer"] = bytearray()
+
+    p = 0
+    for oid, value in cursor.fetchall():
+        p = bisect_left(oids, oid, p)
+        if p == len(oids) or oids[p] != oid:  # nach dem Laden eingefügt
+            continue
+        valid[p >> 3] |= 1 << (p & 7)
+        positions.append(p)
+        if data_type in fixed_types:
+            values.append(value)
+        else:
+            buffer += str(value).encode()
+            offsets.append(len(buffer))
+    return segment
+
+
+# Segment aus dem Cache (LRU auffrischen) oder nachladen und ggf. ältere verdrängen
+def get_segment(cursor, cache, column):
+    segments = cache["segments"]
+    if column in segments:
+        cache["hits"] += 1
+        segments.move_to_end(column)
+        return segments[column]
+    cache["misses"] += 1
+    segment = load_segment(cursor, cache, column)
+    segments[column] = segment
+    cache["bytes"] += segment_size(segment)
+    while cache["bytes"] > cache["max_bytes"] and len(segments) > 1:
+        _, evicted = segments.popitem(last=False)
+        cache["bytes"] -= segment_size(evicted)
+    return segment
+
+
+def segment_value(segment, p):
+    if not segment["valid"][p >> 3] & (1 << (p & 7)):
+        return None
+    j = bisect_left(segment["positions"], p)
+    if segment["type"] == "bol":
+        return bool(segment["values"][j])
+    elif segment["type"] in fixed_types:
+        return segment["values"][j]
+    offsets = segment["offsets"]
+    return text_types[segment["type"]](
+        segment["buffer"][offsets[j] : offsets[j + 1]].decode()
+    )
+
+
+def cache_row(cursor, cache, p, columns):
+    return (
+        cache["oids"][p],
+        *(segment_value(get_segment(cursor, cache, c), p) for c in columns),
+    )
+
+
+# wie SELECT ... WHERE oid = %s; None, wenn die oid nicht existiert
+def cache_get(cursor, cache, oid, columns=None):
+    oids = cache["oids"]
+    p = bisect_left(oids, oid)
+    if p == len(oids) or oids[p] != oid:
+        return None
+    return cache_row(cursor, cache, p, columns or list(cache["columns"]))
+
+
+# wie SELECT ... WHERE column = %s, Scan über die Werte eines Segments
+def cache_find(cursor, cache, column, value, columns=None):
+    segment = get_segment(cursor, cache, column)
+    positions = segment["positions"]
+    if segment["type"] in fixed_types:
+        matches = [p for p, v in zip(positions, segment["values"]) if v == value]
+    elif segment["type"] == "str":
+        value = str(value).encode()
+        offsets, buffer = segment["offsets"], segment["buffer"]
+        matches = [
+            p
+            for j, p in enumerate(positions)
+            if buffer[offsets[j] : offsets[j + 1]] == value
+        ]
+    else:  # Textform nicht eindeutig (z.B. 1.5 vs. 1.50), also typisiert vergleichen
+        matches = [p for p in positions if segment_value(segment, p) == value]
+    columns = columns or list(cache["columns"])
+    return [cache_row(cursor, cache, p, columns) for p in matches]
+
+
+def hit_rate(cache):
+    total = cache["hits"] + cache["misses"]
+    return cache["hits"] / total if total else 0
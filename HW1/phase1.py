@@ -7,6 +7,10 @@ import psycopg2
 import random
 import string
 import math
+import io
+import struct
+from datetime import datetime, timedelta
+from decimal import Decimal
 
 # In[166]:
 
@@ -22,11 +26,17 @@ def print_table(cursor, table_name, max_rows=10):
 
 # In[167]:
 
+
 # a: Verbindung zur Datenbank herstellen
-try:
-    conn = psycopg2.connect(
+# eigene Verbindungen z.B. für parallele Worker
+def connect():
+    return psycopg2.connect(
         dbname="Sparsity", user="postgres", password="", host="localhost", port="5432"
     )
+
+
+try:
+    conn = connect()
     cursor = conn.cursor()
     cursor.execute("SELECT version();")
     print(cursor.fetchone())
@@ -37,6 +47,47 @@ except (Exception, psycopg2.Error) as error:
 # In[168]:
 allowed_strings = string.ascii_lowercase
 allowed_integer = 2**31
+allowed_bigint = 2**62
+allowed_days = 36524  # Datum/Zeitstempel ab 2000-01-01, rund 100 Jahre
+epoch = datetime(2000, 1, 1)  # auch der Nullpunkt des binären COPY-Formats
+
+# Attributtypen als Kürzel (wie data_type in {v}_col), zyklisch zugeordnet:
+# a1 -> column_types[0], a2 -> column_types[1], ...; Voreinstellung für den Parameter
+# column_types der Generatoren, alle Typen z.B. mit
+# generate_table(..., column_types=("str", "int", "big", "dbl", "bol", "dat", "tsp", "num"))
+column_types = ("str", "int")
+sql_types = {
+    "str": "VARCHAR(50)",
+    "int": "INTEGER",
+    "big": "BIGINT",
+    "dbl": "DOUBLE PRECISION",
+    "bol": "BOOLEAN",
+    "dat": "DATE",
+    "tsp": "TIMESTAMP",
+    "num": "NUMERIC(12, 2)",
+}
+# information_schema.columns.data_type -> Kürzel, alles andere wird "str"
+information_schema_types = {
+    "integer": "int",
+    "bigint": "big",
+    "double precision": "dbl",
+    "boolean": "bol",
+    "date": "dat",
+    "timestamp without time zone": "tsp",
+    "numeric": "num",
+}
+
+
+def column_type(col_num, types=None):
+    types = types or column_types
+    return types[(col_num - 1) % len(types)]
+
+
+# SQL-Ausdruck für das Kürzel einer Spalte data_type aus information_schema.columns
+def type_code_sql(data_type_column="data_type"):
+    return f"""CASE {data_type_column} {" ".join(
+        f"WHEN '{name}' THEN '{code}'" for name, code in information_schema_types.items()
+    )} ELSE 'str' END"""
 
 
 def toy_example():
@@ -192,17 +243,14 @@ def toy_example():
     print_table(cursor, "V_toy_all")
 
 
-def create_table(cursor, table_name, num_attributes):
+def create_table(cursor, table_name, num_attributes, column_types=None):
     # Alte Tabelle löschen, falls vorhanden
     cursor.execute(f"DROP TABLE IF EXISTS {table_name};")
 
     # Tabelle H erstellen
     columns = ["oid SERIAL PRIMARY KEY"]
     for i in range(1, num_attributes + 1):
-        if i % 2 == 0:
-            columns.append(f"a{i} INTEGER")
-        else:
-            columns.append(f"a{i} VARCHAR(50)")
+        columns.append(f"a{i} {sql_types[column_type(i, column_types)]}")
     create_table_query = f"CREATE TABLE {table_name} ({', '.join(columns)});"
     cursor.execute(create_table_query)
 
@@ -216,7 +264,7 @@ def get_max_column_num(cursor, table_name):
     cursor.execute(
         f"""
         SELECT COUNT(column_name) AS cn FROM information_schema.columns
-        WHERE table_name = '{table_name}'
+        WHERE table_name = '{table_name}' AND table_schema = current_schema()
     """
     )
     return cursor.fetchone()[0] - 1  # -1 for oid
@@ -231,78 +279,354 @@ def get_columns(cursor, table_name):
     cursor.execute(
         f"""
         SELECT column_name AS cn FROM information_schema.columns
-        WHERE table_name = '{table_name}' AND cn != 'oid';
+        WHERE table_name = '{table_name}' AND table_schema = current_schema()
+        AND cn != 'oid';
     """
     )
     return [row[0] for row in cursor.fetchall()]
 
 
+# Nullzähler aller Spalten in einem einzigen Scan.
+# sample_percent: nur Schätzung über TABLESAMPLE BERNOULLI, mit Konfidenzintervall
+# (Normalapproximation, z=1.96 -> 95%) für den Anteil der NULL-Zellen
+def sparsity_stats(
+    cursor, table_name, num_attributes=None, sample_percent=None, z=1.96
+):
+    if num_attributes is None:
+        num_attributes = get_max_column_num(cursor, table_name)
+    columns = get_column_seq(num_attributes)
+    sample = f" TABLESAMPLE BERNOULLI ({sample_percent})" if sample_percent else ""
+    cursor.execute(
+        f"SELECT COUNT(*), {', '.join(f'COUNT(*) - COUNT({c})' for c in columns)} FROM {table_name}{sample};"
+    )
+    num_tuples, *column_nulls = cursor.fetchone()
+    n = num_tuples * num_attributes
+    nulls = sum(column_nulls)
+    ratio = nulls / n if n else 0.0
+    margin = z * math.sqrt(ratio * (1 - ratio) / n) if sample_percent and n else 0.0
+    return {
+        "tuples": num_tuples,
+        "cells": n,
+        "nulls": nulls,
+        "column_nulls": dict(zip(columns, column_nulls)),
+        "sparsity": ratio,
+        "low": max(0.0, ratio - margin),
+        "high": min(1.0, ratio + margin),
+    }
+
+
 def null_count(cursor, table_name):
-    null_count = 0
-    for col_num in range(1, get_max_column_num(cursor, table_name) + 1):
-        cursor.execute(
-            f"SELECT SUM(CASE WHEN a{col_num} IS NULL THEN 1 ELSE 0 END) a{col_num} FROM {table_name};"
-        )
-        null_count += cursor.fetchone()[0]
-    return null_count
+    return sparsity_stats(cursor, table_name)["nulls"]
+
+
+# sparsity: ein Wert für alle Spalten oder eine Folge mit einem Wert pro Spalte
+# (zyklisch wiederholt), z.B. für dichte und dünne Spalten in einer Tabelle
+def column_sparsity(sparsity, col_num):
+    if isinstance(sparsity, (int, float)):
+        return sparsity
+    return sparsity[(col_num - 1) % len(sparsity)]
+
+
+def mean_sparsity(sparsity, num_attributes):
+    return (
+        sum(column_sparsity(sparsity, i) for i in range(1, num_attributes + 1))
+        / num_attributes
+    )
 
 
 # Begrenzung so, dass alle Werte gleichmöglich sind (Halb sind Integers -> /2)
 def prepare_string_pool(num_tuples, sparsity, num_attributes):
-    max_value_count = num_attributes * (1 - sparsity) * num_tuples / 2
+    max_value_count = (
+        num_attributes * (1 - mean_sparsity(sparsity, num_attributes)) * num_tuples / 2
+    )
     return {c: max_value_count for c in allowed_strings}
 
 
-def generate_column_value(sparsity, col_num, str_pool):
-    if random.random() < sparsity:
-        return "NULL"
-    elif col_num % 2 == 0:
-        return str(random.randint(1, allowed_integer))
+# Rohwert ohne SQL-Formatierung (None = NULL), gemeinsam für INSERT und COPY
+def generate_column_raw(sparsity, col_num, str_pool, column_types=None):
+    data_type = column_type(col_num, column_types)
+    if random.random() < column_sparsity(sparsity, col_num):
+        return None
+    elif data_type == "int":
+        return random.randint(1, allowed_integer)
+    elif data_type == "big":
+        return random.randint(1, allowed_bigint)
+    elif data_type == "dbl":
+        return random.random() * allowed_integer
+    elif data_type == "bol":
+        return random.random() < 0.5
+    elif data_type == "dat":
+        return epoch.date() + timedelta(days=random.randrange(allowed_days))
+    elif data_type == "tsp":
+        return epoch + timedelta(seconds=random.randrange(allowed_days * 86400))
+    elif data_type == "num":
+        return Decimal(random.randint(1, allowed_integer)).scaleb(-2)
     else:
         chosen_value = random.choice(list(str_pool.keys()))
         str_pool[chosen_value] -= 1
         if str_pool[chosen_value] == 0:
             str_pool.pop(chosen_value)
-        return f"'{chosen_value}'"
+        return chosen_value
+
+
+def generate_column_value(sparsity, col_num, str_pool, column_types=None):
+    value = generate_column_raw(sparsity, col_num, str_pool, column_types)
+    if value is None:
+        return "NULL"
+    elif column_type(col_num, column_types) in ("str", "dat", "tsp"):
+        return f"'{value}'"
+    else:
+        return str(value)
+
+
+# Bereich [lo, hi] über einen Anteil width des Wertebereichs der Spalte (nicht für "bol")
+def generate_range(col_num, width=0.01, column_types=None):
+    data_type = column_type(col_num, column_types)
+    if data_type == "str":
+        # mindestens ein Buchstabe Abstand, sonst wäre der Bereich eine Gleichheitssuche
+        n = max(1, math.ceil(width * len(allowed_strings)))
+        i = random.randrange(max(1, len(allowed_strings) - n))
+        j = min(i + n, len(allowed_strings) - 1)
+        return allowed_strings[i], allowed_strings[j]
+    lo = generate_column_raw(0, col_num, None, column_types)
+    if data_type in ("int", "big"):
+        span = allowed_integer if data_type == "int" else allowed_bigint
+        return lo, lo + math.floor(width * span)
+    elif data_type == "dbl":
+        return lo, lo + width * allowed_integer
+    elif data_type == "num":
+        return lo, lo + Decimal(math.floor(width * allowed_integer)).scaleb(-2)
+    elif data_type in ("dat", "tsp"):
+        return lo, lo + timedelta(days=width * allowed_days)
+    raise ValueError(f"no range for type '{data_type}'")
+
+
+def generate_batch(num_rows, sparsity, num_attributes, str_pool, column_types=None):
+    return [
+        [
+            generate_column_raw(sparsity, i, str_pool, column_types)
+            for i in range(1, num_attributes + 1)
+        ]
+        for _ in range(num_rows)
+    ]
+
+
+# COPY text format: tab-getrennt, NULL als \N (Strings aus allowed_strings brauchen kein Escaping)
+def encode_batch_text(rows):
+    buf = io.StringIO()
+    for row in rows:
+        buf.write("\t".join("\\N" if v is None else str(v) for v in row))
+        buf.write("\n")
+    buf.seek(0)
+    return buf
+
+
+# NUMERIC im Binärformat: ndigits, weight (Exponent der ersten Ziffer zur Basis 10000),
+# sign, dscale (Nachkommastellen), dann die Ziffern zur Basis 10000
+def encode_numeric_binary(value):
+    sign, digits, exponent = value.as_tuple()
+    n = int("".join(map(str, digits)) or "0")
+    dscale = max(0, -exponent)
+    frac_groups = (dscale + 3) // 4
+    n *= 10 ** (frac_groups * 4 - dscale) if exponent < 0 else 10**exponent
+    groups = []
+    while n:
+        groups.append(n % 10000)
+        n //= 10000
+    groups.reverse()
+    weight = len(groups) - frac_groups - 1 if groups else 0
+    while groups and groups[-1] == 0:
+        groups.pop()
+    return struct.pack(
+        f">ihhhh{len(groups)}H",
+        8 + 2 * len(groups),
+        len(groups),
+        weight,
+        0x4000 if sign and groups else 0,
+        dscale,
+        *groups,
+    )
+
+
+# COPY binary format: Header, je Tupel Feldanzahl + (Länge, Daten) pro Feld, Trailer -1
+def encode_batch_binary(rows, num_attributes, column_types=None):
+    buf = io.BytesIO()
+    buf.write(b"PGCOPY\n\xff\r\n\0" + struct.pack(">ii", 0, 0))
+    field_count = struct.pack(">h", num_attributes)
+    null_field = struct.pack(">i", -1)
+    for row in rows:
+        buf.write(field_count)
+        for i, v in enumerate(row, start=1):
+            data_type = column_type(i, column_types)
+            if v is None:
+                buf.write(null_field)
+            elif data_type == "int":
+                buf.write(struct.pack(">ii", 4, v))
+            elif data_type == "big":
+                buf.write(struct.pack(">iq", 8, v))
+            elif data_type == "dbl":
+                buf.write(struct.pack(">id", 8, v))
+            elif data_type == "bol":
+                buf.write(struct.pack(">i?", 1, v))
+            elif data_type == "dat":  # Tage seit 2000-01-01
+                buf.write(struct.pack(">ii", 4, (v - epoch.date()).days))
+            elif data_type == "tsp":  # Mikrosekunden seit 2000-01-01
+                buf.write(
+                    struct.pack(">iq", 8, (v - epoch) // timedelta(microseconds=1))
+                )
+            elif data_type == "num":
+                buf.write(encode_numeric_binary(v))
+            else:
+                data = v.encode()
+                buf.write(struct.pack(">i", len(data)))
+                buf.write(data)
+    buf.write(struct.pack(">h", -1))
+    buf.seek(0)
+    return buf
+
+
+def copy_table(
+    cursor,
+    table_name,
+    num_tuples,
+    sparsity,
+    num_attributes,
+    batch_size,
+    binary,
+    column_types=None,
+):
+    str_pool = prepare_string_pool(num_tuples, sparsity, num_attributes)
+    copy_query = f"COPY {table_name} ({', '.join(get_column_seq(num_attributes))}) FROM STDIN{' WITH (FORMAT binary)' if binary else ''}"
+    for start in range(0, num_tuples, batch_size):
+        rows = generate_batch(
+            min(batch_size, num_tuples - start),
+            sparsity,
+            num_attributes,
+            str_pool,
+            column_types,
+        )
+        if binary:
+            cursor.copy_expert(
+                copy_query, encode_batch_binary(rows, num_attributes, column_types)
+            )
+        else:
+            cursor.copy_expert(copy_query, encode_batch_text(rows))
+        cursor.connection.commit()
+
+
+# Zufallswert je Typ für generate_table_server, gleiche Verteilung wie generate_column_raw
+server_values = {
+    "str": "(%(pool)s::varchar(50)[])[1 + floor(random() * %(pool_size)s)::int]",
+    "int": "1 + floor(random() * (%(max_int)s - 1))::int",
+    "big": "1 + floor(random() * (%(max_bigint)s - 1))::bigint",
+    "dbl": "random() * %(max_int)s",
+    "bol": "random() < 0.5",
+    "dat": "DATE '2000-01-01' + floor(random() * %(max_days)s)::int",
+    "tsp": "TIMESTAMP '2000-01-01' + floor(random() * %(max_days)s * 86400) * INTERVAL '1 second'",
+    "num": "((1 + floor(random() * (%(max_int)s - 1)))::numeric / 100)::numeric(12, 2)",
+}
+
+
+# Komplett serverseitig: ein INSERT ... SELECT über generate_series, random() pro Zelle.
+# Strings werden gleichverteilt aus allowed_strings gezogen - der Pool aus prepare_string_pool
+# erlaubt jedem Wert bereits die erwartete Gesamtzahl an Strings, wird also praktisch nie erschöpft.
+def generate_table_server(
+    cursor, table_name, num_tuples, sparsity, num_attributes, column_types=None
+):
+    values = []
+    for i in range(1, num_attributes + 1):
+        value = server_values[column_type(i, column_types)]
+        values.append(
+            f"CASE WHEN random() < {float(column_sparsity(sparsity, i))} THEN NULL ELSE {value} END"
+        )
+    cursor.execute(
+        f"""
+        INSERT INTO {table_name} ({', '.join(get_column_seq(num_attributes))})
+        SELECT {', '.join(values)}
+        FROM generate_series(1, %(num_tuples)s)
+    """,
+        {
+            "max_int": allowed_integer,
+            "max_bigint": allowed_bigint,
+            "max_days": allowed_days,
+            "pool": list(allowed_strings),
+            "pool_size": len(allowed_strings),
+            "num_tuples": num_tuples,
+        },
+    )
 
 
 # c: Korrigierte Funktion generate()
-def generate_table(cursor, table_name, num_tuples, sparsity, num_attributes):
+# method: "insert" (ein INSERT pro Tupel, commit alle batch_size Tupel),
+# "copy" (COPY ... FROM STDIN in Batches zu batch_size Tupeln, binary=True für das Binärformat)
+# "server" (alles per INSERT ... SELECT in der Datenbank, keine Tupeldaten über die Leitung);
+# column_types: Typkürzel je Attribut, zyklisch (None = phase1.column_types)
+def generate_table(
+    cursor,
+    table_name,
+    num_tuples,
+    sparsity,
+    num_attributes,
+    method="insert",
+    batch_size=None,
+    binary=False,
+    column_types=None,
+):
     try:
-        create_table(cursor, table_name, num_attributes)
-
-        str_pool = prepare_string_pool(num_tuples, sparsity, num_attributes)
-
-        conn.commit()
-        # Daten einfügen
-        for r in range(1, num_tuples + 1):
-            values = []
-            for i in range(1, num_attributes + 1):
-                values.append(generate_column_value(sparsity, i, str_pool))
-            insert_query = f"INSERT INTO {table_name} ({', '.join([f'a{i}' for i in range(1, num_attributes + 1)] )}) VALUES ({', '.join(values)});"
-            cursor.execute(insert_query)
-            if r % 1024 == 0:
-                conn.commit()
-
-        conn.commit()
+        create_table(cursor, table_name, num_attributes, column_types)
+        cursor.connection.commit()
+
+        if method == "copy":
+            copy_table(
+                cursor,
+                table_name,
+                num_tuples,
+                sparsity,
+                num_attributes,
+                batch_size or 2**16,
+                binary,
+                column_types,
+            )
+        elif method == "server":
+            generate_table_server(
+                cursor, table_name, num_tuples, sparsity, num_attributes, column_types
+            )
+        elif method == "insert":
+            str_pool = prepare_string_pool(num_tuples, sparsity, num_attributes)
+
+            # Daten einfügen
+            for r in range(1, num_tuples + 1):
+                values = []
+                for i in range(1, num_attributes + 1):
+                    values.append(
+                        generate_column_value(sparsity, i, str_pool, column_types)
+                    )
+                insert_query = f"INSERT INTO {table_name} ({', '.join([f'a{i}' for i in range(1, num_attributes + 1)] )}) VALUES ({', '.join(values)});"
+                cursor.execute(insert_query)
+                if r % (batch_size or 1024) == 0:
+                    cursor.connection.commit()
+        else:
+            raise ValueError(f"unknown generation method '{method}'")
+
+        cursor.connection.commit()
         print(
-            f"Generated '{table_name}': tpl={num_tuples}, spars={sparsity:.6}, attr={num_attributes}"
+            f"Generated '{table_name}': tpl={num_tuples}, spars={mean_sparsity(sparsity, num_attributes):.6}, attr={num_attributes}"
         )
     except (Exception, psycopg2.Error) as error:
         print("Fehler in generate():", error)
 
 
-def generate(num_tuples, sparsity, num_attributes):
-    generate_table(cursor, "H", num_tuples, sparsity, num_attributes)
+def generate(num_tuples, sparsity, num_attributes, method="insert"):
+    generate_table(cursor, "H", num_tuples, sparsity, num_attributes, method)
 
 
 def generate_randomized(
-    table_name="rnd_h", tuple_limit=10, attr_limit=10, value_preview=10
+    table_name="rnd_h", tuple_limit=10, attr_limit=10, value_preview=10, method="insert"
 ):
     num_tuples = random.randint(1, tuple_limit)
     sparsity = random.random()
     num_attributes = random.randint(1, attr_limit)
-    generate_table(cursor, table_name, num_tuples, sparsity, num_attributes)
+    generate_table(cursor, table_name, num_tuples, sparsity, num_attributes, method)
     if value_preview != 0:
         print_table(
             cursor,
@@ -313,15 +637,19 @@ def generate_randomized(
                 else math.ceil(value_preview / num_attributes)
             ),
         )
-    return sparsity
+    return sparsity, num_attributes
 
 
-def test_sparsity(cursor, table_name, sparsity):
-    nulls = null_count(cursor, table_name)
-    cursor.execute(f"SELECT COUNT(*) FROM {table_name};")
-    num_tuples = cursor.fetchone()[0]
-    num_attributes = get_max_column_num(cursor, table_name)
-    n = num_tuples * num_attributes
+# Stichprobenzellen sind ebenfalls unabhängig generiert -> gleiche Prüfung mit kleinerem n
+def test_sparsity(
+    cursor, table_name, sparsity, num_attributes=None, sample_percent=None
+):
+    stats = sparsity_stats(cursor, table_name, num_attributes, sample_percent)
+    nulls = stats["nulls"]
+    n = stats["cells"]
+    if n == 0:
+        print("Sparsity not checked: no tuples sampled")
+        return False
     # primitive 95% deviation check - should use z_0.5 range from statistics instead
     variance = math.sqrt(n * sparsity * (1 - sparsity)) * 2
     ok = abs(nulls - sparsity * n) < variance
@@ -332,14 +660,20 @@ def test_sparsity(cursor, table_name, sparsity):
 
 
 def test_generator_randomized(
-    size, table_name="rnd_h", tuple_limit=10, attr_limit=10, value_preview=10
+    size,
+    table_name="rnd_h",
+    tuple_limit=10,
+    attr_limit=10,
+    value_preview=10,
+    method="insert",
+    sample_percent=None,
 ):
     ok_count = 0
     for _ in range(size):
-        sparsity = generate_randomized(
-            table_name, tuple_limit, attr_limit, value_preview
+        sparsity, num_attributes = generate_randomized(
+            table_name, tuple_limit, attr_limit, value_preview, method
         )
-        ok = test_sparsity(cursor, table_name, sparsity)
+        ok = test_sparsity(cursor, table_name, sparsity, num_attributes, sample_percent)
         if ok:
             ok_count += 1
     print(f"Generations within formidable deviation: {ok_count}/{size}")
@@ -3,11 +3,18 @@
 
 # In[1]:
 
-from math import log, sqrt, floor
+from math import log, sqrt, floor, inf
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 import time
 import random
+import psycopg2
 import phase1
+import storage
+import colcache
+import workload as workloads
 import json
+import os
 
 # In[2]:
 
@@ -17,116 +24,1073 @@ cursor = phase1.cursor
 # In[3]:
 
 
-def h2v(cursor, h_table_name, v_table_name, indexing=False):
-    for suffix in "str", "int", "null", "col":
+# {v}_col je vertikaler Tabelle (spalte -> (typ, key_id)),
+# damit Query-Builder nicht pro Anfrage nachschlagen müssen
+v_column_cache = {}
+
+
+def get_v_columns(cursor, v_table_name):
+    if v_table_name not in v_column_cache:
+        cursor.execute(f"SELECT column_name, data_type, key_id FROM {v_table_name}_col")
+        v_column_cache[v_table_name] = {c: (t, k) for c, t, k in cursor.fetchall()}
+    return v_column_cache[v_table_name]
+
+
+# Typen der Wertetabellen {v}_{typ}: _str und _int gibt es immer,
+# die übrigen aus phase1.sql_types nur, wenn h Spalten dieses Typs hat
+def get_v_types(cursor, v_table_name):
+    return sorted(
+        {"str", "int"} | {t for t, _ in get_v_columns(cursor, v_table_name).values()}
+    )
+
+
+# alle oids genau einmal: Wertetabellen per UNION, _null ist dazu disjunkt
+def v_oids(v_table_name, types):
+    return f"""(
+            {" UNION ".join(f"(SELECT oid FROM {v_table_name}_{t})" for t in types)}
+            UNION ALL -- null rows are not stored in other tables -> still unique
+            (SELECT oid FROM {v_table_name}_null)
+        )"""
+
+
+# oid_ref hat in keiner Wertetabelle einen Eintrag (gehört also nach _null)
+def v_no_values(v_table_name, types, oid_ref):
+    return " AND ".join(
+        f"NOT EXISTS (SELECT 1 FROM {v_table_name}_{t} AS x WHERE x.oid = {oid_ref})"
+        for t in types
+    )
+
+
+# eine Wertetabelle {v}_{typ} je Typ mit nativem Werttyp (phase1.sql_types), damit
+# Vergleiche und Bereichsprädikate nicht über Text laufen und B-Bäume richtig sortieren.
+# partitioned: Wertetabellen als LIST-partitionierte Tabellen mit einer Partition
+# {v}_{typ}_{key_id} pro Attribut, damit Anfragen auf ein Attribut alle anderen überspringen;
+# columns: nur diese Spalten von h übernehmen (None = alle)
+def create_v_tables(
+    cursor, h_table_name, v_table_name, partitioned=False, columns=None
+):
+    v_column_cache.pop(v_table_name, None)
+    for suffix in *phase1.sql_types, "null", "col":
         cursor.execute(f"DROP TABLE IF EXISTS {v_table_name}_{suffix} CASCADE;")
+    partitioning = "PARTITION BY LIST (key)" if partitioned else ""
     cursor.execute(
         f"""
-        CREATE TABLE {v_table_name}_str (oid INTEGER, key VARCHAR(50), value VARCHAR(50));
-        CREATE TABLE {v_table_name}_int (oid INTEGER, key VARCHAR(50), value INTEGER);
         CREATE TABLE {v_table_name}_null (oid INTEGER);
-        CREATE TABLE {v_table_name}_col (column_name VARCHAR(50), data_type CHAR(3));
+        CREATE TABLE {v_table_name}_col (
+            key_id SMALLINT PRIMARY KEY, column_name VARCHAR(50), data_type CHAR(3)
+        );
     """
     )
 
+    # Wörterbuch: die Partitionen speichern nur die key_id statt des Spaltennamens
     cursor.execute(
         f"""
         INSERT INTO {v_table_name}_col
         SELECT
+            ROW_NUMBER() OVER (ORDER BY ordinal_position),
             column_name,
-            CASE WHEN data_type = 'integer' THEN 'int' ELSE 'str' END
+            {phase1.type_code_sql()}
         FROM information_schema.columns
-        WHERE table_name = '{h_table_name}' AND column_name != 'oid'
-    """
+        WHERE table_name = '{h_table_name}' AND table_schema = current_schema()
+        AND column_name != 'oid' {"" if columns is None else "AND column_name::TEXT = ANY(%s::TEXT[])"}
+    """,
+        None if columns is None else (list(columns),),
     )
 
-    cursor.execute(f"SELECT * FROM {v_table_name}_col")
-
+    cursor.execute(
+        f"SELECT column_name, data_type, key_id FROM {v_table_name}_col ORDER BY key_id"
+    )
     columns = cursor.fetchall()
 
-    for [column, data_type] in columns:
-        if data_type != "int":
-            cursor.execute(
-                f"""
-                INSERT INTO {v_table_name}_str (oid, key, value)
-                SELECT oid, '{column}', {column}
-                FROM {h_table_name}
-                WHERE {column} IS NOT NULL
-            """
-            )
-        else:
+    for data_type in get_v_types(cursor, v_table_name):
+        cursor.execute(
+            f"""
+            CREATE TABLE {v_table_name}_{data_type} (
+                oid INTEGER, key SMALLINT, value {phase1.sql_types[data_type]}
+            ) {partitioning}
+        """
+        )
+    if partitioned:
+        for _, data_type, key_id in columns:
             cursor.execute(
                 f"""
-                INSERT INTO {v_table_name}_int (oid, key, value)
-                SELECT oid, '{column}', {column}
-                FROM {h_table_name}
-                WHERE {column} IS NOT NULL
+                CREATE TABLE {v_table_name}_{data_type}_{key_id}
+                PARTITION OF {v_table_name}_{data_type} FOR VALUES IN ({key_id})
             """
             )
 
+    return columns
+
+
+# eine Spalte nach der anderen: ein Scan von h pro Attribut
+def h2v_columns(cursor, h_table_name, v_table_name, columns):
+    for [column, data_type, key_id] in columns:
+        cursor.execute(
+            f"""
+            INSERT INTO {v_table_name}_{data_type} (oid, key, value)
+            SELECT oid, {key_id}, {column}
+            FROM {h_table_name}
+            WHERE {column} IS NOT NULL
+        """
+        )
+
     cursor.execute(
         f"""
         INSERT INTO {v_table_name}_null (oid)
-        SELECT oid FROM {h_table_name}
-        WHERE oid NOT IN (
-            SELECT DISTINCT oid FROM {v_table_name}_int
-            FULL OUTER JOIN {v_table_name}_str USING (oid)
-        )"""
+        SELECT h.oid FROM {h_table_name} AS h
+        WHERE {v_no_values(v_table_name, get_v_types(cursor, v_table_name), "h.oid")}"""
     )
 
-    if indexing:
-        for suffix in "str", "int", "null":
-            cursor.execute(
-                f"CREATE INDEX IF NOT EXISTS idx_{v_table_name}_oid ON {v_table_name}_{suffix}(oid);"
+
+# ein Scan von h für alle Attribute eines oid-Bereichs [lo, hi]:
+# LATERAL VALUES entpivotiert jede Zeile in eine Wertspalte pro Typ,
+# das CTE wird einmal berechnet und nach Typ verteilt
+def h2v_chunk(cursor, h_table_name, v_table_name, columns, lo, hi):
+    types = get_v_types(cursor, v_table_name)
+    unpivot = ", ".join(
+        f"""({k}::SMALLINT, {", ".join(
+            f"{'h.' + c if u == t else 'NULL'}::{phase1.sql_types[u]}" for u in types
+        )})"""
+        for c, t, k in columns
+    )
+    inserts = [
+        f"""INSERT INTO {v_table_name}_{t} (oid, key, value)
+        SELECT oid, key, {t}_value FROM u WHERE {t}_value IS NOT NULL"""
+        for t in types
+    ]
+    cursor.execute(
+        f"""
+        WITH u AS (
+            SELECT h.oid, x.*
+            FROM {h_table_name} AS h
+            CROSS JOIN LATERAL (VALUES {unpivot})
+            AS x(key, {", ".join(f"{t}_value" for t in types)})
+            WHERE h.oid BETWEEN {lo} AND {hi}
+            AND num_nonnulls({", ".join(f"x.{t}_value" for t in types)}) > 0
+        ), {", ".join(f"s_{t} AS ({insert})" for t, insert in zip(types, inserts[:-1]))}
+        {inserts[-1]}
+    """
+    )
+    # Änderungen aus dem CTE sind erst im nächsten Statement sichtbar
+    cursor.execute(
+        f"""
+        INSERT INTO {v_table_name}_null (oid)
+        SELECT h.oid FROM {h_table_name} AS h
+        WHERE h.oid BETWEEN {lo} AND {hi}
+        AND {v_no_values(v_table_name, types, "h.oid")}
+    """
+    )
+
+
+def h2v_chunk_worker(search_path, h_table_name, v_table_name, columns, lo, hi):
+    worker_conn = phase1.connect()
+    try:
+        chunk_cursor = worker_conn.cursor()
+        chunk_cursor.execute(f"SET search_path TO {search_path}")
+        h2v_chunk(chunk_cursor, h_table_name, v_table_name, columns, lo, hi)
+        worker_conn.commit()
+    finally:
+        worker_conn.close()
+
+
+# chunk_size: Größe der oid-Bereiche (None = ein Bereich);
+# workers > 1 verteilt die Bereiche auf eigene Verbindungen
+def h2v_scan(cursor, h_table_name, v_table_name, columns, chunk_size=None, workers=1):
+    cursor.execute(f"SELECT MIN(oid), MAX(oid) FROM {h_table_name}")
+    min_oid, max_oid = cursor.fetchone()
+    if min_oid is None:
+        return
+    chunk_size = chunk_size or max_oid - min_oid + 1
+    ranges = [
+        (lo, min(lo + chunk_size - 1, max_oid))
+        for lo in range(min_oid, max_oid + 1, chunk_size)
+    ]
+
+    if workers <= 1:
+        for lo, hi in ranges:
+            h2v_chunk(cursor, h_table_name, v_table_name, columns, lo, hi)
+        return
+
+    cursor.connection.commit()  # Tabellen müssen für die Worker sichtbar sein
+    cursor.execute("SHOW search_path")
+    search_path = cursor.fetchone()[0]
+    with ThreadPoolExecutor(workers) as pool:
+        for future in [
+            pool.submit(
+                h2v_chunk_worker,
+                search_path,
+                h_table_name,
+                v_table_name,
+                columns,
+                lo,
+                hi,
             )
-        for suffix in "str", "int":
+            for lo, hi in ranges
+        ]:
+            future.result()
+
+
+# VACUUM läuft nicht in einer Transaktion
+def vacuum(cursor, table_names):
+    cursor.connection.autocommit = True
+    try:
+        cursor.execute(f"VACUUM (ANALYZE) {', '.join(table_names)}")
+    finally:
+        cursor.connection.autocommit = False
+
+
+# Indexprofile der vertikalen Tabellen: Name -> (Indizes je Wertetabelle, Indizes für _null);
+# "range": B-Baum auf (key, value) im nativen Werttyp für Bereichsprädikate, plus oid
+index_profiles = {
+    "default": (["(oid)", "(key)"], ["(oid)"]),
+    "oid_key": (["(oid, key) INCLUDE (value)"], ["(oid)"]),
+    "key_value": (["(key, value) INCLUDE (oid)"], ["(oid)"]),
+    "range": (["(oid)", "(key, value)"], ["(oid)"]),
+    "hash": (["USING hash (oid)"], ["USING hash (oid)"]),
+    "brin": (["USING brin (oid)"], ["USING brin (oid)"]),
+}
+
+
+def create_v_indexes(cursor, v_table_name, profile):
+    value_indexes, null_indexes = index_profiles[profile]
+    for suffix, indexes in [
+        *((t, value_indexes) for t in get_v_types(cursor, v_table_name)),
+        ("null", null_indexes),
+    ]:
+        # Name pro Partition, sonst überspringt IF NOT EXISTS alle außer der ersten
+        for n, index in enumerate(indexes):
             cursor.execute(
-                f"CREATE INDEX IF NOT EXISTS idx_{v_table_name}_key ON {v_table_name}_{suffix}(key);"
+                f"CREATE INDEX IF NOT EXISTS idx_{v_table_name}_{suffix}_{n} ON {v_table_name}_{suffix} {index};"
             )
 
-    conn.commit()
+
+# method: "column" (ein INSERT ... SELECT pro Attribut) oder "scan" (h2v_scan)
+# indexing: False, True (Profil "default") oder ein Name aus index_profiles
+def h2v(
+    cursor,
+    h_table_name,
+    v_table_name,
+    indexing=False,
+    method="column",
+    chunk_size=None,
+    workers=1,
+    partitioned=False,
+    columns=None,
+):
+    columns = create_v_tables(cursor, h_table_name, v_table_name, partitioned, columns)
+
+    if method == "scan":
+        h2v_scan(cursor, h_table_name, v_table_name, columns, chunk_size, workers)
+    elif method == "column":
+        h2v_columns(cursor, h_table_name, v_table_name, columns)
+    else:
+        raise ValueError(f"unknown h2v method '{method}'")
+
+    if indexing:
+        create_v_indexes(
+            cursor, v_table_name, "default" if indexing is True else indexing
+        )
+
+    cursor.connection.commit()
+    if indexing:  # Sichtbarkeitskarte setzen, sonst keine Index-Only-Scans
+        vacuum(
+            cursor,
+            [
+                f"{v_table_name}_{s}"
+                for s in get_v_types(cursor, v_table_name) + ["null"]
+            ],
+        )
 
 
-def v2h(cursor, v_table_name, h_view_name):
+# method: "join" (ein LEFT JOIN pro Attribut) oder "agg" (ein GROUP BY oid mit FILTER-Aggregaten)
+def v2h(cursor, v_table_name, h_view_name, method="join"):
     cursor.execute(f"DROP VIEW IF EXISTS {h_view_name}")
 
-    cursor.execute(f"SELECT column_name, data_type FROM {v_table_name}_col")
+    cursor.execute(f"SELECT column_name, data_type, key_id FROM {v_table_name}_col")
     typed_cols = cursor.fetchall()
     typed_cols = sorted(typed_cols, key=lambda x: x[0])
 
+    if method == "agg":
+        v2h_agg(cursor, v_table_name, h_view_name, typed_cols)
+    elif method == "join":
+        v2h_join(cursor, v_table_name, h_view_name, typed_cols)
+    else:
+        raise ValueError(f"unknown v2h method '{method}'")
+
+    cursor.connection.commit()
+
+
+def v2h_join(cursor, v_table_name, h_view_name, typed_cols):
     cursor.execute(  # how do we not loose the empty column?
         f"""
         CREATE VIEW {h_view_name} AS
         SELECT b.oid, {
-            ", ".join([f"v{c}.value AS {c}" for c,_ in typed_cols])
-        } FROM (
-            (SELECT oid FROM {v_table_name}_str)
-            UNION
-            (SELECT oid FROM {v_table_name}_int)
-            UNION ALL -- null rows are not stored in other tables -> still unique
-            (SELECT oid FROM {v_table_name}_null)
-        ) AS b {"\n".join(
-            f"LEFT JOIN {v_table_name}_{t} AS v{c} ON b.oid = v{c}.oid AND v{c}.key = '{c}'"
-            for c,t in typed_cols
+            ", ".join([f"v{c}.value AS {c}" for c,_,_ in typed_cols])
+        } FROM {v_oids(v_table_name, get_v_types(cursor, v_table_name))} AS b {"\n".join(
+            f"LEFT JOIN {v_table_name}_{t} AS v{c} ON b.oid = v{c}.oid AND v{c}.key = {k}"
+            for c,t,k in typed_cols
         )}"""
     )
 
-    conn.commit()
 
+# MAX gibt es nicht für BOOLEAN, pro oid und key steht aber ohnehin höchstens ein Wert da
+def pivot_columns(typed_cols):
+    return ", ".join(
+        f"{'bool_or' if t == 'bol' else 'MAX'}({t}_value) FILTER (WHERE key = {k})"
+        f"{'::VARCHAR(50)' if t == 'str' else ''} AS {c}"
+        for c, t, k in typed_cols
+    )
+
+
+# alle Wertetabellen untereinander mit einer Wertspalte {typ}_value pro Typ;
+# with_null: auch die oids aus _null (condition darf dann nur oid verwenden)
+def pivot_source(v_table_name, types, condition="TRUE", with_null=True):
+    def values(data_type):
+        return ", ".join(
+            f"{'value' if t == data_type else f'NULL::{phase1.sql_types[t]}'} AS {t}_value"
+            for t in types
+        )
+
+    branches = [
+        f"SELECT oid, key, {values(t)} FROM {v_table_name}_{t} WHERE {condition}"
+        for t in types
+    ]
+    if with_null:
+        branches.append(
+            f"SELECT oid, NULL, {values(None)} FROM {v_table_name}_null WHERE {condition}"
+        )
+    return "\n            UNION ALL\n            ".join(branches)
+
+
+# Pivot ohne Joins: alle Partitionen untereinander, dann pro Spalte ein gefiltertes Aggregat;
+# condition schränkt jede Partition ein (z.B. auf bestimmte oids)
+def pivot_query(cursor, v_table_name, typed_cols, condition="TRUE"):
+    return f"""
+        SELECT oid, {pivot_columns(typed_cols)} FROM (
+            {pivot_source(v_table_name, get_v_types(cursor, v_table_name), condition)}
+        ) AS u
+        GROUP BY oid"""
+
+
+def v2h_agg(cursor, v_table_name, h_view_name, typed_cols):
+    cursor.execute(
+        f"CREATE VIEW {h_view_name} AS {pivot_query(cursor, v_table_name, typed_cols)}"
+    )
+
+
+def v_write_value(v_table_name, column, data_type, key_id):
+    return f"""
+            IF NEW.{column} IS NOT NULL THEN
+                INSERT INTO {v_table_name}_{data_type} (oid, key, value)
+                VALUES (NEW.oid, {key_id}, NEW.{column});
+            END IF;"""
+
+
+# INSTEAD OF-Trigger, damit die v2h-Sicht wie h beschreibbar ist: UPDATE ohne neue oid
+# fasst nur geänderte Attribute an und verschiebt die oid nach/aus _null, wenn alle Werte
+# NULL werden bzw. der erste Wert dazukommt; INSERT, DELETE und neue oid schreiben alles neu,
+# eine bereits vorhandene oid bei INSERT oder UPDATE der oid wird abgewiesen
+def make_writable(cursor, v_table_name, h_view_name):
+    typed_cols = sorted(get_v_columns(cursor, v_table_name).items())
+    types = get_v_types(cursor, v_table_name)
+    new_values = ", ".join(f"NEW.{c}" for c, _ in typed_cols)
+    old_values = ", ".join(f"OLD.{c}" for c, _ in typed_cols)
+    update_columns = "".join(
+        f"""
+            IF NEW.{c} IS DISTINCT FROM OLD.{c} THEN
+                DELETE FROM {v_table_name}_{t} WHERE oid = OLD.oid AND key = {k};
+                {v_write_value(v_table_name, c, t, k)}
+            END IF;"""
+        for c, (t, k) in typed_cols
+    )
+    insert_columns = "".join(
+        v_write_value(v_table_name, c, t, k) for c, (t, k) in typed_cols
+    )
+
+    # oids für INSERT ohne oid, hinter der größten vorhandenen
+    cursor.execute(
+        f"""
+        CREATE SEQUENCE IF NOT EXISTS {v_table_name}_oid_seq;
+        SELECT setval('{v_table_name}_oid_seq', GREATEST({", ".join(
+            f"(SELECT MAX(oid) FROM {v_table_name}_{s})" for s in types + ["null"]
+        )}, 0) + 1, false);
+    """
+    )
+    cursor.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION {h_view_name}_write() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND NEW.oid IS NOT DISTINCT FROM OLD.oid THEN
+                {update_columns}
+                IF num_nonnulls({new_values}) = 0 AND num_nonnulls({old_values}) > 0 THEN
+                    INSERT INTO {v_table_name}_null (oid) VALUES (NEW.oid);
+                ELSIF num_nonnulls({new_values}) > 0 AND num_nonnulls({old_values}) = 0 THEN
+                    DELETE FROM {v_table_name}_null WHERE oid = OLD.oid;
+                END IF;
+                RETURN NEW;
+            END IF;
+
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                {"".join(
+                    f"DELETE FROM {v_table_name}_{s} WHERE oid = OLD.oid;"
+                    for s in types + ["null"]
+                )}
+                IF TG_OP = 'DELETE' THEN
+                    RETURN OLD;
+                END IF;
+            END IF;
+
+            IF NEW.oid IS NULL THEN
+                NEW.oid := nextval('{v_table_name}_oid_seq');
+            END IF;
+            -- wie der Primärschlüssel von h: eine vorhandene oid nicht ein zweites Mal anlegen
+            IF {" OR ".join(
+                f"EXISTS (SELECT 1 FROM {v_table_name}_{s} WHERE oid = NEW.oid)"
+                for s in types + ["null"]
+            )} THEN
+                RAISE EXCEPTION 'oid % already exists in {h_view_name}', NEW.oid
+                    USING ERRCODE = 'unique_violation';
+            END IF;
+            {insert_columns}
+            IF num_nonnulls({new_values}) = 0 THEN
+                INSERT INTO {v_table_name}_null (oid) VALUES (NEW.oid);
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER {h_view_name}_write
+        INSTEAD OF INSERT OR UPDATE OR DELETE ON {h_view_name}
+        FOR EACH ROW EXECUTE FUNCTION {h_view_name}_write();
+    """
+    )
+    cursor.connection.commit()
+
+
+# materialisierte h-Sicht: echte Tabelle mit Primärschlüssel auf oid, die
+# Statement-Trigger auf den Wertetabellen und _null nur für die betroffenen oids neu pivotieren
+def materialize_v2h(cursor, v_table_name, mat_table_name):
+    typed_cols = sorted(
+        (c, t, k) for c, (t, k) in get_v_columns(cursor, v_table_name).items()
+    )
+    cursor.execute(f"DROP TABLE IF EXISTS {mat_table_name} CASCADE")
+    cursor.execute(
+        f"""
+        CREATE TABLE {mat_table_name} (oid INTEGER PRIMARY KEY, {", ".join(
+            f"{c} {phase1.sql_types[t]}" for c, t, _ in typed_cols
+        )})"""
+    )
+    refresh_materialized(cursor, v_table_name, mat_table_name)
+
+    cursor.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION {mat_table_name}_repivot(oids INTEGER[]) RETURNS void AS $$
+        BEGIN
+            DELETE FROM {mat_table_name} WHERE oid = ANY(oids);
+            INSERT INTO {mat_table_name}
+            {pivot_query(cursor, v_table_name, typed_cols, "oid = ANY(oids)")};
+        END
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION {mat_table_name}_sync() RETURNS trigger AS $$
+        DECLARE
+            oids INTEGER[];
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                SELECT array_agg(DISTINCT oid) INTO oids FROM new_rows;
+            ELSIF TG_OP = 'DELETE' THEN
+                SELECT array_agg(DISTINCT oid) INTO oids FROM old_rows;
+            ELSE
+                SELECT array_agg(oid) INTO oids
+                FROM (SELECT oid FROM new_rows UNION SELECT oid FROM old_rows) AS t;
+            END IF;
+            IF oids IS NOT NULL THEN
+                PERFORM {mat_table_name}_repivot(oids);
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+    """
+    )
+    for suffix in get_v_types(cursor, v_table_name) + ["null"]:
+        cursor.execute(
+            f"""
+            CREATE OR REPLACE TRIGGER {mat_table_name}_sync_ins AFTER INSERT ON {v_table_name}_{suffix}
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION {mat_table_name}_sync();
+            CREATE OR REPLACE TRIGGER {mat_table_name}_sync_upd AFTER UPDATE ON {v_table_name}_{suffix}
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION {mat_table_name}_sync();
+            CREATE OR REPLACE TRIGGER {mat_table_name}_sync_del AFTER DELETE ON {v_table_name}_{suffix}
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION {mat_table_name}_sync();
+        """
+        )
+    cursor.connection.commit()
+
+
+# Massenweg, z.B. nach h2v oder mit abgeschalteter Synchronisation: alles neu pivotieren
+def refresh_materialized(cursor, v_table_name, mat_table_name):
+    typed_cols = sorted(
+        (c, t, k) for c, (t, k) in get_v_columns(cursor, v_table_name).items()
+    )
+    cursor.execute(f"TRUNCATE {mat_table_name}")
+    cursor.execute(
+        f"INSERT INTO {mat_table_name} {pivot_query(cursor, v_table_name, typed_cols)}"
+    )
+    cursor.connection.commit()
+
+
+def set_materialized_sync(cursor, v_table_name, mat_table_name, enabled=True):
+    for suffix in get_v_types(cursor, v_table_name) + ["null"]:
+        for op in "ins", "upd", "del":
+            cursor.execute(
+                f"ALTER TABLE {v_table_name}_{suffix} {'ENABLE' if enabled else 'DISABLE'} TRIGGER {mat_table_name}_sync_{op}"
+            )
+    cursor.connection.commit()
+
+
+# Prädikat auf expression: Gleichheit oder, für ein Tupel (lo, hi), Bereich -> (sql, params)
+def predicate(expression, value):
+    if isinstance(value, tuple):
+        return f"{expression} BETWEEN %s AND %s", list(value)
+    return f"{expression} = %s", [value]
+
+
+# SQL für eine horizontale Sicht auf nur die angefragten Spalten, direkt auf den Wertetabellen.
+# where: {spalte: wert oder (lo, hi)} (auch "oid"); das erste Attribut-Prädikat liefert die Basis-oids
+# aus seiner Partition, weitere werden als INNER JOIN in die passende Partition geschoben.
+def v2h_select(cursor, v_table_name, columns=None, where=None):
+    types = get_v_columns(cursor, v_table_name)
+    columns = columns or sorted(types)
+    where = dict(where or {})
+    oid = where.pop("oid", None)
+    params = []
+
+    if where:
+        c = next(iter(where))
+        t, k = types[c]
+        condition, condition_params = predicate("value", where.pop(c))
+        base = f"(SELECT oid FROM {v_table_name}_{t} WHERE key = {k} AND {condition})"
+        params += condition_params
+    else:
+        base = v_oids(v_table_name, get_v_types(cursor, v_table_name))
+
+    joins = []
+    for c in columns + [c for c in where if c not in columns]:
+        t, k = types[c]
+        join = f"{v_table_name}_{t} AS v{c} ON b.oid = v{c}.oid AND v{c}.key = {k}"
+        if c in where:
+            condition, condition_params = predicate(f"v{c}.value", where[c])
+            joins.append(f"JOIN {join} AND {condition}")
+            params += condition_params
+        else:
+            joins.append(f"LEFT JOIN {join}")
+
+    query = f"""
+        SELECT b.oid, {", ".join(f"v{c}.value AS {c}" for c in columns)}
+        FROM {base} AS b {" ".join(joins)}"""
+    if oid is not None:
+        condition, condition_params = predicate("b.oid", oid)
+        query += f" WHERE {condition}"
+        params += condition_params
+    return query, params
+
+
+# Wertsuche mit Prädikat-Pushdown: passende oids über (key, value) in den Wertetabellen finden,
+# bei mehreren Prädikaten schneiden (INTERSECT), dann nur diese Tupel pivotieren.
+# where: {spalte: wert}, mindestens ein Attribut, optional "oid"
+def v2h_lookup(cursor, v_table_name, where, columns=None):
+    types = get_v_columns(cursor, v_table_name)
+    columns = columns or sorted(types)
+    where = dict(where)
+    oid = where.pop("oid", None)
+    params = []
+
+    matches = []
+    for c, value in where.items():
+        t, k = types[c]
+        condition, condition_params = predicate("value", value)
+        match = f"SELECT oid FROM {v_table_name}_{t} WHERE key = {k} AND {condition}"
+        params += condition_params
+        if oid is not None:
+            condition, condition_params = predicate("oid", oid)
+            match += f" AND {condition}"
+            params += condition_params
+        matches.append(match)
+
+    key_filter = ", ".join(str(types[c][1]) for c in columns)
+    query = f"""
+        WITH m AS ({" INTERSECT ".join(matches)})
+        SELECT m.oid, {pivot_columns((c, *types[c]) for c in columns)}
+        FROM m LEFT JOIN (
+            {pivot_source(
+                v_table_name,
+                get_v_types(cursor, v_table_name),
+                f"oid IN (SELECT oid FROM m) AND key IN ({key_filter})",
+                with_null=False,
+            )}
+        ) AS u ON u.oid = m.oid
+        GROUP BY m.oid"""
+    return query, params
+
+
+# Schwelle zwischen dichten und dünnen Spalten aus den gemessenen Dichten: an der größten
+# Lücke (Faktor >= 10) zwischen zwei sortierten Dichten, sonst default
+def choose_density_threshold(densities, default=0.5):
+    ordered = sorted(d for d in densities if d > 0)
+    best, threshold = 10, default
+    for low, high in zip(ordered, ordered[1:]):
+        if high / low >= best:
+            best, threshold = high / low, sqrt(low * high)
+    return threshold
+
+
+# Hybrid: Spalten mit Dichte >= threshold bleiben horizontal in {hy}_h, die dünnen
+# gehen in die vertikalen Wertetabellen {hy}_{typ}; {hy}_view vereint beide
+def h2hybrid(cursor, h_table_name, hy_table_name, threshold=None, indexing=False):
+    stats = phase1.sparsity_stats(cursor, h_table_name)
+    densities = {
+        c: 1 - nulls / stats["tuples"] if stats["tuples"] else 0.0
+        for c, nulls in stats["column_nulls"].items()
+    }
+    if threshold is None:
+        threshold = choose_density_threshold(densities.values())
+    dense = [c for c, d in densities.items() if d >= threshold]
+    sparse = [c for c, d in densities.items() if d < threshold]
+
+    cursor.execute(f"DROP TABLE IF EXISTS {hy_table_name}_h CASCADE")
+    cursor.execute(
+        f"""
+        CREATE TABLE {hy_table_name}_h AS
+        SELECT {", ".join(["oid"] + dense)} FROM {h_table_name}
+    """
+    )
+    cursor.execute(f"ALTER TABLE {hy_table_name}_h ADD PRIMARY KEY (oid)")
+
+    cursor.execute(f"DROP VIEW IF EXISTS {hy_table_name}_view")
+    if sparse:
+        h2v(cursor, h_table_name, hy_table_name, indexing, columns=sparse)
+        v2h(cursor, hy_table_name, f"{hy_table_name}_sparse", "agg")
+        sparse_join = f"LEFT JOIN {hy_table_name}_sparse AS v USING (oid)"
+    else:  # kein vertikaler Teil, auch keine Reste eines früheren Laufs
+        v_column_cache.pop(hy_table_name, None)
+        for table_name in storage.v_layout_tables(hy_table_name, phase1.sql_types):
+            cursor.execute(f"DROP TABLE IF EXISTS {table_name} CASCADE")
+        sparse_join = ""
+    cursor.execute(
+        f"""
+        CREATE VIEW {hy_table_name}_view AS
+        SELECT oid, {", ".join(sorted(densities))}
+        FROM {hy_table_name}_h {sparse_join}
+    """
+    )
+    cursor.connection.commit()
+    return {"threshold": threshold, "dense": dense, "sparse": sparse}
 
-def test_identity(cursor, table1, table2):
-    # for whatever reason, the order of the original table breaks at 80+
-    cursor.execute(f"SELECT * FROM {table1} ORDER BY oid")
-    rows1 = cursor.fetchall()
-    # update changes order so there is also no other way
-    cursor.execute(f"SELECT * FROM {table2} ORDER BY oid")
-    rows2 = cursor.fetchall()
-    print(len(rows1), len(rows2))
-    assert len(rows1) == len(rows2)
-    for r1, r2 in zip(rows1, rows2):
-        if r1 != r2:
-            print(f"Different rows:\n{r1}\n{r2}")
+
+# Tabellen der Hybrid-Darstellung: {hy}_h und, falls es dünne Spalten gibt, der vertikale Teil
+def hybrid_tables(cursor, hy_table_name):
+    cursor.execute(f"SELECT to_regclass('{hy_table_name}_col')")
+    if cursor.fetchone()[0] is None:
+        return [f"{hy_table_name}_h"]
+    return [f"{hy_table_name}_h"] + storage.v_layout_tables(
+        hy_table_name, get_v_types(cursor, hy_table_name)
+    )
+
+
+# Spalten einer horizontalen Tabelle/Sicht als [(spalte, typ)] in Tabellenreihenfolge
+def get_h_columns(cursor, table_name):
+    cursor.execute(
+        f"""
+        SELECT column_name, {phase1.type_code_sql()}
+        FROM information_schema.columns
+        WHERE table_name = '{table_name}' AND table_schema = current_schema()
+        AND column_name != 'oid'
+        ORDER BY ordinal_position
+    """
+    )
+    return cursor.fetchall()
+
+
+# Spalte aus dem Dokument, identisch in Sicht und Ausdrucksindex (sonst kein Indexmatch)
+def jsonb_column(column, data_type):
+    return f"((doc->>'{column}')::{phase1.sql_types[data_type]})"
+
+
+# Typen, deren Werte in JSON genauso aussehen wie in to_jsonb (für @>-Containment);
+# Datum, Zeitstempel und NUMERIC werden über den typisierten Ausdruck verglichen
+jsonb_native_types = ("str", "int", "big", "dbl", "bol")
+# Text -> DATE/TIMESTAMP hängt von DateStyle ab (nur STABLE), taugt also nicht für Ausdrucksindizes
+jsonb_stable_types = ("dat", "tsp")
+
+
+# Spaltentypen je JSONB-Tabelle für jsonb_select (spalte -> typ)
+jsonb_column_cache = {}
+
+
+def get_jsonb_columns(cursor, j_table_name):
+    if j_table_name not in jsonb_column_cache:
+        jsonb_column_cache[j_table_name] = dict(
+            get_h_columns(cursor, f"{j_table_name}_view")
+        )
+    return jsonb_column_cache[j_table_name]
+
+
+# Attribute mit Ausdrucksindex je JSONB-Tabelle; jsonb_select vergleicht sie über
+# jsonb_column statt per @>, damit der B-Baum-Index greift
+jsonb_hot_key_cache = {}
+
+
+def get_jsonb_hot_keys(cursor, j_table_name):
+    if j_table_name not in jsonb_hot_key_cache:
+        cursor.execute(
+            f"""
+            SELECT substr(indexname, length('idx_{j_table_name}_') + 1) FROM pg_indexes
+            WHERE tablename = '{j_table_name}' AND schemaname = current_schema()
+            AND indexname LIKE 'idx\\_{j_table_name}\\_%' AND indexname != 'idx_{j_table_name}_doc'
+        """
+        )
+        jsonb_hot_key_cache[j_table_name] = {c for [c] in cursor.fetchall()}
+    return jsonb_hot_key_cache[j_table_name]
+
+
+# JSONB-Darstellung: ein Dokument mit allen Nicht-NULL-Attributen pro oid.
+# indexing: GIN (jsonb_path_ops) für @>-Wertsuchen plus Ausdrucksindizes für hot_keys
+def h2jsonb(cursor, h_table_name, j_table_name, indexing=False, hot_keys=()):
+    columns = get_h_columns(cursor, h_table_name)
+    jsonb_column_cache[j_table_name] = dict(columns)
+    jsonb_hot_key_cache[j_table_name] = set()
+    cursor.execute(f"DROP TABLE IF EXISTS {j_table_name} CASCADE")
+    cursor.execute(
+        f"""
+        CREATE TABLE {j_table_name} (oid INTEGER PRIMARY KEY, doc JSONB NOT NULL);
+        INSERT INTO {j_table_name} (oid, doc)
+        SELECT oid, jsonb_strip_nulls(to_jsonb(h) - 'oid') FROM {h_table_name} AS h;
+        CREATE VIEW {j_table_name}_view AS
+        SELECT oid, {", ".join(
+            f"{jsonb_column(c, t)} AS {c}" for c, t in sorted(columns)
+        )} FROM {j_table_name};
+    """
+    )
+    if indexing:
+        cursor.execute(
+            f"CREATE INDEX idx_{j_table_name}_doc ON {j_table_name} USING gin (doc jsonb_path_ops)"
+        )
+        for c in hot_keys:
+            if dict(columns)[c] in jsonb_stable_types:
+                print(f"Skipping expression index on '{c}': cast is not immutable")
+                continue
+            cursor.execute(
+                f"CREATE INDEX idx_{j_table_name}_{c} ON {j_table_name} ({jsonb_column(c, dict(columns)[c])})"
+            )
+            jsonb_hot_key_cache[j_table_name].add(c)
+    cursor.connection.commit()
+    if indexing:
+        vacuum(cursor, [j_table_name])
+
+
+# Anfrage auf die JSONB-Tabelle: Wertprädikate als Containment (@>, nutzt den GIN-Index),
+# Attribute mit Ausdrucksindex (hot_keys) als Vergleich auf den typisierten Ausdruck
+def jsonb_select(cursor, j_table_name, columns=None, where=None):
+    types = get_jsonb_columns(cursor, j_table_name)
+    hot_keys = get_jsonb_hot_keys(cursor, j_table_name)
+    where = dict(where or {})
+    oid = where.pop("oid", None)
+    conditions, params = [], []
+    contained = {
+        c: value
+        for c, value in where.items()
+        if not isinstance(value, tuple)
+        and types[c] in jsonb_native_types
+        and c not in hot_keys
+    }
+    if contained:
+        conditions.append("doc @> %s::JSONB")
+        params.append(json.dumps(contained))
+    for c, value in where.items():
+        if c not in contained:
+            condition, condition_params = predicate(jsonb_column(c, types[c]), value)
+            conditions.append(condition)
+            params += condition_params
+    if oid is not None:
+        condition, condition_params = predicate("oid", oid)
+        conditions.append(condition)
+        params += condition_params
+    return (
+        f"""
+        SELECT oid, {", ".join(
+            f"{jsonb_column(c, types[c])} AS {c}" for c in columns or sorted(types)
+        )} FROM {j_table_name}
+        {f"WHERE {' AND '.join(conditions)}" if conditions else ""}""",
+        params,
+    )
+
+
+# Array-Darstellung: eine Zeile pro oid mit parallelen Arrays, key_ids zuerst die
+# übrigen Attribute (als Text in str_vals), dann die Integer-Attribute (passend zu int_vals)
+def array_value(column, data_type, key_id):
+    position = f"array_position(key_ids, {key_id}::SMALLINT)"
+    if data_type == "int":
+        return f"int_vals[{position} - cardinality(str_vals)]"
+    return f"str_vals[{position}]::{phase1.sql_types[data_type]}"
+
+
+# {a}_col ist das Wörterbuch wie bei h2v (get_v_columns funktioniert auch hierfür);
+# indexing: GIN auf beiden Wert-Arrays für Wertsuchen per @>
+def h2array(cursor, h_table_name, a_table_name, indexing=False):
+    v_column_cache.pop(a_table_name, None)
+    columns = [
+        (c, t, k) for k, (c, t) in enumerate(get_h_columns(cursor, h_table_name), 1)
+    ]
+    str_cols = [(c, k) for c, t, k in columns if t != "int"]
+    int_cols = [(c, k) for c, t, k in columns if t == "int"]
+
+    for suffix in "", "_col":
+        cursor.execute(f"DROP TABLE IF EXISTS {a_table_name}{suffix} CASCADE")
+    cursor.execute(
+        f"""
+        CREATE TABLE {a_table_name}_col (
+            key_id SMALLINT PRIMARY KEY, column_name VARCHAR(50), data_type CHAR(3)
+        );
+        CREATE TABLE {a_table_name} (
+            oid INTEGER PRIMARY KEY,
+            key_ids SMALLINT[] NOT NULL,
+            str_vals TEXT[] NOT NULL,
+            int_vals INTEGER[] NOT NULL
+        );
+    """
+    )
+    cursor.executemany(
+        f"INSERT INTO {a_table_name}_col VALUES (%s, %s, %s)",
+        [(k, c, t) for c, t, k in columns],
+    )
+    cursor.execute(
+        f"""
+        INSERT INTO {a_table_name} (oid, key_ids, str_vals, int_vals)
+        SELECT
+            oid,
+            array_remove(ARRAY[{", ".join(
+                f"CASE WHEN {c} IS NOT NULL THEN {k} END" for c, k in str_cols + int_cols
+            )}]::SMALLINT[], NULL),
+            array_remove(ARRAY[{", ".join(f"{c}::TEXT" for c, _ in str_cols)}]::TEXT[], NULL),
+            array_remove(ARRAY[{", ".join(c for c, _ in int_cols)}]::INTEGER[], NULL)
+        FROM {h_table_name}
+    """
+    )
+    cursor.execute(
+        f"""
+        CREATE VIEW {a_table_name}_view AS
+        SELECT oid, {", ".join(
+            f"{array_value(c, t, k)} AS {c}" for c, t, k in sorted(columns)
+        )} FROM {a_table_name}
+    """
+    )
+    if indexing:
+        for column in "str_vals", "int_vals":
+            cursor.execute(
+                f"CREATE INDEX idx_{a_table_name}_{column} ON {a_table_name} USING gin ({column})"
+            )
+    cursor.connection.commit()
+    if indexing:
+        vacuum(cursor, [a_table_name])
+
+
+# Wertprädikate: @> auf dem Wert-Array (GIN), danach Prüfung an der Position des Attributs
+def array_select(cursor, a_table_name, columns=None, where=None):
+    types = get_v_columns(cursor, a_table_name)
+    where = dict(where or {})
+    oid = where.pop("oid", None)
+    conditions, params = [], []
+    for c, value in where.items():
+        t, k = types[c]
+        condition, condition_params = predicate(array_value(c, t, k), value)
+        # GIN-Vorfilter nur für Gleichheit, und nur wo der Text in str_vals eindeutig ist
+        if t in ("str", "int") and not isinstance(value, tuple):
+            condition = f"{'int_vals @> ARRAY[%s]::INTEGER[]' if t == 'int' else 'str_vals @> ARRAY[%s]::TEXT[]'} AND {condition}"
+            condition_params = [value] + condition_params
+        conditions.append(condition)
+        params += condition_params
+    if oid is not None:
+        condition, condition_params = predicate("oid", oid)
+        conditions.append(condition)
+        params += condition_params
+    return (
+        f"""
+        SELECT oid, {", ".join(
+            f"{array_value(c, *types[c])} AS {c}" for c in columns or sorted(types)
+        )} FROM {a_table_name}
+        {f"WHERE {' AND '.join(conditions)}" if conditions else ""}""",
+        params,
+    )
+
+
+# Batch-Lookup mehrerer oids in einer Anfrage auf einer Tabelle/Sicht:
+# method "any" (oid = ANY(array)) oder "unnest" (Join mit unnest(array))
+def batch_lookup_h(cursor, table_name, oids, method="any"):
+    if method == "unnest":
+        query = f"SELECT t.* FROM unnest(%s::INTEGER[]) AS b(oid) JOIN {table_name} AS t USING (oid)"
+    elif method == "any":
+        query = f"SELECT * FROM {table_name} WHERE oid = ANY(%s::INTEGER[])"
+    else:
+        raise ValueError(f"unknown batch lookup method '{method}'")
+    cursor.execute(query, (list(oids),))
+    return cursor.fetchall()
+
+
+# Batch-Lookup auf den vertikalen Partitionen: eine Anfrage pro Partition,
+# Pivot im Client; Zeilen wie in h_view (oid, Spalten nach Namen sortiert)
+def batch_lookup_v(cursor, v_table_name, oids):
+    types = get_v_columns(cursor, v_table_name)
+    positions = {k: i for i, (_, (_, k)) in enumerate(sorted(types.items()))}
+    oids = list(oids)
+    rows = {}
+    for suffix in get_v_types(cursor, v_table_name):
+        cursor.execute(
+            f"SELECT oid, key, value FROM {v_table_name}_{suffix} WHERE oid = ANY(%s::INTEGER[])",
+            (oids,),
+        )
+        for oid, key, value in cursor.fetchall():
+            rows.setdefault(oid, [None] * len(positions))[positions[key]] = value
+    cursor.execute(
+        f"SELECT oid FROM {v_table_name}_null WHERE oid = ANY(%s::INTEGER[])", (oids,)
+    )
+    for [oid] in cursor.fetchall():
+        rows[oid] = [None] * len(positions)
+    return [(oid, *values) for oid, values in sorted(rows.items())]
+
+
+# gleiche Spalten in gleicher Reihenfolge auf beiden Seiten (SELECT * hätte z.B. in h
+# a1, a2, ..., a10, in h_view aber a1, a10, a2, ...), oid zuerst
+def identity_columns(cursor, table1, table2):
+    columns1 = sorted(c for c, _ in get_h_columns(cursor, table1))
+    columns2 = sorted(c for c, _ in get_h_columns(cursor, table2))
+    if columns1 != columns2:
+        raise ValueError(f"different columns: {columns1} vs. {columns2}")
+    return ["oid"] + columns1
+
+
+def oid_filter(lo=None, hi=None):
+    return "TRUE" if lo is None else f"oid BETWEEN {lo} AND {hi}"
+
+
+# EXCEPT ALL in beide Richtungen, komplett in der Datenbank; die ersten limit oids
+def diff_except(cursor, table1, table2, columns, limit=10, lo=None, hi=None):
+    def side(a, b):
+        return f"""
+            SELECT {", ".join(columns)} FROM {a} WHERE {oid_filter(lo, hi)}
+            EXCEPT ALL
+            SELECT {", ".join(columns)} FROM {b} WHERE {oid_filter(lo, hi)}"""
+
+    cursor.execute(
+        f"""
+        SELECT DISTINCT oid FROM (({side(table1, table2)}) UNION ALL ({side(table2, table1)})) AS d
+        ORDER BY oid LIMIT {limit}
+    """
+    )
+    return [oid for [oid] in cursor.fetchall()]
+
+
+# Anzahl und Summe der Zeilen-Hashes je Teilbereich von [lo, hi] (unabhängig von der Reihenfolge)
+def range_hashes(cursor, table_name, columns, lo, hi, chunk_size):
+    cursor.execute(
+        f"""
+        SELECT (oid - {lo}) / {chunk_size}, COUNT(*),
+            SUM(hashtextextended(ROW({", ".join(columns)})::TEXT, 0))
+        FROM {table_name} WHERE {oid_filter(lo, hi)}
+        GROUP BY 1
+    """
+    )
+    return {bucket: (count, hash) for bucket, count, hash in cursor.fetchall()}
+
+
+# Bereiche mit unterschiedlichen Hash-Aggregaten rekursiv in fanout Teile zerlegen,
+# ab leaf_size oids per diff_except vergleichen; übereinstimmende Bereiche entfallen
+def diff_hash(cursor, table1, table2, columns, limit=10, fanout=16, leaf_size=4096):
+    cursor.execute(
+        f"""
+        SELECT MIN(oid), MAX(oid) FROM (
+            SELECT oid FROM {table1} UNION ALL SELECT oid FROM {table2}
+        ) AS o
+    """
+    )
+    lo, hi = cursor.fetchone()
+    diffs = []
+
+    def narrow(lo, hi):
+        if len(diffs) >= limit:
+            return
+        if hi - lo < leaf_size:
+            diffs.extend(
+                diff_except(cursor, table1, table2, columns, limit - len(diffs), lo, hi)
+            )
             return
+        chunk_size = -(-(hi - lo + 1) // fanout)
+        hashes1 = range_hashes(cursor, table1, columns, lo, hi, chunk_size)
+        hashes2 = range_hashes(cursor, table2, columns, lo, hi, chunk_size)
+        for bucket in sorted(set(hashes1) | set(hashes2)):
+            if hashes1.get(bucket) != hashes2.get(bucket):
+                start = lo + bucket * chunk_size
+                narrow(start, min(start + chunk_size - 1, hi))
+
+    if lo is not None:
+        narrow(lo, hi)
+    return diffs
+
+
+# Rückfall ohne Vergleich auf dem Server: beide Seiten über benannte (serverseitige)
+# Cursor in oid-Reihenfolge streamen und im Client mischen; Werte werden in Python
+# verglichen, also auch bei Typen ohne Gleichheitsoperator oder unterschiedlichen Typen
+def diff_stream(cursor, table1, table2, columns, limit=10, itersize=2**12):
+    streams = []
+    for n, table_name in enumerate((table1, table2)):
+        stream = cursor.connection.cursor(name=f"identity_{table_name}_{n}")
+        stream.itersize = itersize
+        stream.execute(f"SELECT {', '.join(columns)} FROM {table_name} ORDER BY oid")
+        streams.append(stream)
+    try:
+        rows1, rows2 = (iter(stream) for stream in streams)
+        r1, r2 = next(rows1, None), next(rows2, None)
+        diffs = []
+        while (r1 is not None or r2 is not None) and len(diffs) < limit:
+            if r2 is None or (r1 is not None and r1[0] < r2[0]):
+                oid, r1 = r1[0], next(rows1, None)
+            elif r1 is None or r2[0] < r1[0]:
+                oid, r2 = r2[0], next(rows2, None)
+            else:
+                oid = r1[0] if r1 != r2 else None
+                r1, r2 = next(rows1, None), next(rows2, None)
+            if oid is not None and (not diffs or diffs[-1] != oid):
+                diffs.append(oid)
+        return diffs
+    finally:
+        for stream in streams:
+            stream.close()
+
+
+# method: "except", "hash" (diff_hash) oder "stream"; schlägt der serverseitige
+# Vergleich fehl (z.B. Typen ohne Gleichheit), wird gestreamt. Liefert die ersten limit
+# abweichenden oids (leer = identisch)
+def test_identity(cursor, table1, table2, method="except", limit=10):
+    columns = identity_columns(cursor, table1, table2)
+    try:
+        if method == "except":
+            diffs = diff_except(cursor, table1, table2, columns, limit)
+        elif method == "hash":
+            diffs = diff_hash(cursor, table1, table2, columns, limit)
+        elif method == "stream":
+            diffs = diff_stream(cursor, table1, table2, columns, limit)
+        else:
+            raise ValueError(f"unknown identity method '{method}'")
+    except psycopg2.Error as error:
+        cursor.connection.rollback()
+        print(f"Server-side comparison failed ({error}), streaming instead")
+        diffs = diff_stream(cursor, table1, table2, columns, limit)
+    if diffs:
+        print(f"Different rows for oids: {diffs}")
+    else:
+        print(f"{table1} and {table2} are identical")
+    return diffs
 
 
 def test_transform_randomized(cursor):
@@ -164,27 +1128,256 @@ def test_transform_identity(cursor, size=3):
     test_identity(cursor, table_name, "h_view")
 
 
-test_transform_identity(cursor)
+# gleiche Schreibzugriffe auf h und über die beschreibbare h_view auf v, danach identisch;
+# prüft die Wege über _null, oid-Änderung, DELETE und die Abweisung vorhandener oids,
+# außerdem dass h_mat per Trigger bzw. nach refresh_materialized der Pivotierung entspricht
+def test_writable(cursor, size=4):
+    num_attributes = size
+    phase1.generate_table(cursor, "h", size, 0.5, num_attributes)
+    h2v(cursor, "h", "v")
+    v2h(cursor, "v", "h_view")
+    make_writable(cursor, "v", "h_view")
+    materialize_v2h(cursor, "v", "h_mat")
+
+    columns = phase1.get_column_seq(num_attributes)
+    str_pool = dict.fromkeys(phase1.allowed_strings, inf)
+    values = [
+        phase1.generate_column_raw(0, i, str_pool) for i in range(1, num_attributes + 1)
+    ]
+
+    def write(query, params):
+        for table_name in "h", "h_view":
+            cursor.execute(query.format(t=table_name), params)
+        cursor.connection.commit()
+
+    def in_v_null(oid):
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM v_null WHERE oid = %s)", (oid,))
+        return cursor.fetchone()[0]
+
+    write("INSERT INTO {t} (oid) VALUES (%s)", (size + 1,))
+    assert in_v_null(size + 1)
+    write(
+        f"INSERT INTO {{t}} (oid, {', '.join(columns)}) VALUES (%s, {', '.join(['%s'] * num_attributes)})",
+        (size + 2, *values),
+    )
+    write("UPDATE {t} SET a1 = %s WHERE oid = %s", (values[0], size + 1))
+    assert not in_v_null(size + 1)
+    write("UPDATE {t} SET a1 = NULL WHERE oid = %s", (size + 1,))  # letzter Wert weg
+    assert in_v_null(size + 1)
+    write("UPDATE {t} SET a1 = %s WHERE oid = %s", (values[0], size + 1))
+    assert not in_v_null(size + 1)
+    write("UPDATE {t} SET oid = %s WHERE oid = %s", (size + 3, size + 2))
+    write("DELETE FROM {t} WHERE oid = %s", (1,))
+
+    for query, params in (
+        ("INSERT INTO h_view (oid) VALUES (%s)", (size + 1,)),
+        ("UPDATE h_view SET oid = %s WHERE oid = %s", (size + 1, size + 3)),
+    ):
+        try:
+            cursor.execute(query, params)
+        except psycopg2.IntegrityError:  # unique_violation aus dem Trigger
+            cursor.connection.rollback()
+        else:
+            raise AssertionError(f"duplicate oid accepted: {query} {params}")
+
+    diffs = test_identity(cursor, "h", "h_view")
+    assert not diffs
+    assert not test_identity(cursor, "h_view", "h_mat")
+
+    # ohne Nachführung schreiben, dann alles neu pivotieren
+    set_materialized_sync(cursor, "v", "h_mat", False)
+    write("UPDATE {t} SET a1 = NULL WHERE oid = %s", (size + 3,))
+    write("DELETE FROM {t} WHERE oid = %s", (2,))
+    refresh_materialized(cursor, "v", "h_mat")
+    set_materialized_sync(cursor, "v", "h_mat", True)
+    assert not test_identity(cursor, "h_view", "h_mat")
+    return diffs
+
+
+if __name__ == "__main__":  # nicht in Worker-Prozessen
+    test_transform_identity(cursor)
+
+
+# projection: Anzahl zufällig gewählter Spalten (None = alle)
+def pick_columns(num_attributes, projection):
+    if not projection:
+        return None
+    return [
+        f"a{i}"
+        for i in sorted(
+            random.sample(range(1, num_attributes + 1), min(projection, num_attributes))
+        )
+    ]
+
+
+# mode: "table" (Tabelle/Sicht table_name direkt), "pruned" (v2h_select) oder
+# "pushdown" (v2h_lookup für Wertsuchen) auf der vertikalen Tabelle table_name,
+# "jsonb" (jsonb_select) bzw. "array" (array_select) auf der jeweiligen Tabelle table_name
+def select_query(cursor, table_name, columns, where, mode):
+    if mode == "jsonb":
+        return jsonb_select(cursor, table_name, columns, where)
+    elif mode == "array":
+        return array_select(cursor, table_name, columns, where)
+    elif mode == "pushdown" and set(where) != {"oid"}:
+        return v2h_lookup(cursor, table_name, where, columns)
+    elif mode in ("pruned", "pushdown"):
+        return v2h_select(cursor, table_name, columns, where)
+    elif mode != "table":
+        raise ValueError(f"unknown query mode '{mode}'")
+    conditions = [predicate(c, value) for c, value in where.items()]
+    return (
+        f"SELECT {', '.join(['oid'] + columns) if columns else '*'} FROM {table_name} WHERE {' AND '.join(c for c, _ in conditions)}",
+        [p for _, condition_params in conditions for p in condition_params],
+    )
+
+
+def oid_query(
+    cursor, table_name, num_tuples, num_attributes=0, projection=None, mode="table"
+):
+    return select_query(
+        cursor,
+        table_name,
+        pick_columns(num_attributes, projection),
+        {"oid": random.randint(1, num_tuples)},
+        mode,
+    )
+
+
+# Wert im Typ der Spalte (phase1.column_type), verteilt wie beim Generieren
+def random_predicate(num_attributes, column_types=None):
+    i = random.randint(1, num_attributes)
+    str_pool = dict.fromkeys(phase1.allowed_strings, inf)
+    return f"a{i}", phase1.generate_column_raw(0, i, str_pool, column_types)
+
+
+def vals_query(
+    cursor,
+    table_name,
+    num_attributes,
+    projection=None,
+    mode="table",
+    column_types=None,
+):
+    column, value = random_predicate(num_attributes, column_types)
+    return select_query(
+        cursor,
+        table_name,
+        pick_columns(num_attributes, projection),
+        {column: value},
+        mode,
+    )
+
+
+def bench_oid(
+    cursor, table_name, num_tuples, num_attributes=0, projection=None, mode="table"
+):
+    cursor.execute(
+        *oid_query(cursor, table_name, num_tuples, num_attributes, projection, mode)
+    )
+
+
+def bench_vals(
+    cursor,
+    table_name,
+    num_attributes,
+    projection=None,
+    mode="table",
+    column_types=None,
+):
+    cursor.execute(
+        *vals_query(cursor, table_name, num_attributes, projection, mode, column_types)
+    )
+
+
+# Bereichsscan über einen Anteil width des Wertebereichs eines Attributs (kein BOOLEAN)
+def range_query(
+    cursor,
+    table_name,
+    num_attributes,
+    projection=None,
+    mode="table",
+    width=0.01,
+    column_types=None,
+):
+    i = random.choice(
+        [
+            i
+            for i in range(1, num_attributes + 1)
+            if phase1.column_type(i, column_types) != "bol"
+        ]
+    )
+    return select_query(
+        cursor,
+        table_name,
+        pick_columns(num_attributes, projection),
+        {f"a{i}": phase1.generate_range(i, width, column_types)},
+        mode,
+    )
 
 
-def bench_oid(cursor, table_name, num_tuples):
+def bench_range(
+    cursor,
+    table_name,
+    num_attributes,
+    projection=None,
+    mode="table",
+    width=0.01,
+    column_types=None,
+):
     cursor.execute(
-        f"SELECT * FROM {table_name} WHERE oid = {random.randint(1, num_tuples)}"
+        *range_query(
+            cursor, table_name, num_attributes, projection, mode, width, column_types
+        )
     )
 
 
-def bench_vals(cursor, table_name, num_attributes):
-    i = random.randint(1, num_attributes)
-    if i % 2 == 0:
+# nächste Anfrage eines Zugriffsmusters aus workload.make_workload
+def workload_query(cursor, table_name, workload, mode="table"):
+    kind = workloads.next_kind(workload)
+    if kind == "value":
+        where = dict([workload["value"]()])
+    else:
+        where = {"oid": workload[kind]()}
+    return select_query(
+        cursor,
+        table_name,
+        pick_columns(workload["num_attributes"], workload["projection"]),
+        where,
+        mode,
+    )
+
+
+# ein Schreibzugriff mit eigenem Commit: je zur Hälfte INSERT eines neuen Tupels oder
+# UPDATE eines Attributs eines bestehenden (mit Wahrscheinlichkeit sparsity auf NULL)
+def bench_write(
+    cursor, table_name, num_tuples, num_attributes, sparsity=0.5, column_types=None
+):
+    str_pool = dict.fromkeys(phase1.allowed_strings, inf)
+    if random.random() < 0.5:
         cursor.execute(
-            f"SELECT * FROM {table_name} WHERE a{i} = {random.randint(1, phase1.allowed_integer)}"
+            f"INSERT INTO {table_name} ({', '.join(phase1.get_column_seq(num_attributes))}) VALUES ({', '.join(['%s'] * num_attributes)})",
+            [
+                phase1.generate_column_raw(sparsity, i, str_pool, column_types)
+                for i in range(1, num_attributes + 1)
+            ],
         )
     else:
+        i = random.randint(1, num_attributes)
         cursor.execute(
-            f"SELECT * FROM {table_name} WHERE a{i} = '{random.choice(phase1.allowed_strings)}'"
+            f"UPDATE {table_name} SET a{i} = %s WHERE oid = %s",
+            (
+                phase1.generate_column_raw(sparsity, i, str_pool, column_types),
+                random.randint(1, num_tuples),
+            ),
         )
+    cursor.connection.commit()
 
 
+# write_preference: Anteil Schreibzugriffe (bench_write) im Mix - nur für mode "table"
+# auf h oder einer Sicht mit make_writable;
+# range_preference: Anteil Bereichsscans (bench_range) an den Wertsuchen;
+# workload: Zugriffsmuster (workload.make_workload) statt bench_oid/bench_vals;
+# column_types: Typkürzel der Attribute wie beim Generieren (für Werte und Bereiche)
 def bench_table(
     cursor,
     table_name,
@@ -193,6 +1386,14 @@ def bench_table(
     num_queries=1000,
     oid_test_preference=0.5,
     max_time=5,
+    projection=None,
+    mode="table",
+    write_preference=0,
+    sparsity=0.5,
+    range_preference=0,
+    range_width=0.01,
+    workload=None,
+    column_types=None,
 ):
     start_time = time.perf_counter()
     i = 0
@@ -201,64 +1402,939 @@ def bench_table(
     if oid_test_preference < 0:  # to ensure both tests are run at least once
         while i < num_queries:
             i += 2
-            bench_oid(cursor, table_name, num_tuples)
-            bench_vals(cursor, table_name, num_attributes)
+            bench_oid(cursor, table_name, num_tuples, num_attributes, projection, mode)
+            bench_vals(
+                cursor, table_name, num_attributes, projection, mode, column_types
+            )
             end_time = time.perf_counter()
             if end_time - start_time > max_time:
                 break
     else:
         while i < num_queries:
             i += 1
-            if random.random() < oid_test_preference:
-                bench_oid(cursor, table_name, num_tuples)
+            if write_preference and random.random() < write_preference:
+                bench_write(
+                    cursor,
+                    table_name,
+                    num_tuples,
+                    num_attributes,
+                    sparsity,
+                    column_types,
+                )
+            elif workload:
+                cursor.execute(*workload_query(cursor, table_name, workload, mode))
+            elif random.random() < oid_test_preference:
+                bench_oid(
+                    cursor, table_name, num_tuples, num_attributes, projection, mode
+                )
+            elif range_preference and random.random() < range_preference:
+                bench_range(
+                    cursor,
+                    table_name,
+                    num_attributes,
+                    projection,
+                    mode,
+                    range_width,
+                    column_types,
+                )
             else:
-                bench_vals(cursor, table_name, num_attributes)
+                bench_vals(
+                    cursor, table_name, num_attributes, projection, mode, column_types
+                )
             end_time = time.perf_counter()
             if end_time - start_time > max_time:
                 break
     return i / (end_time - start_time - i * measure_loss)
 
 
-def bench_compare(
+# PREPARE beim ersten Auftreten eines SQL-Texts (statements: SQL -> Name),
+# liefert das passende EXECUTE; %s-Platzhalter werden zu $1, $2, ...
+def prepare_query(cursor, query, num_params, statements):
+    name = statements.get(query)
+    if name is None:
+        name = f"bench_q{len(statements)}"
+        parts = query.split("%s")
+        cursor.execute(
+            f"PREPARE {name} AS "
+            + "".join(f"{part}${i}" for i, part in enumerate(parts[:-1], start=1))
+            + parts[-1]
+        )
+        statements[query] = name
+    return f"EXECUTE {name}({', '.join(['%s'] * num_params)})"
+
+
+# Latenzen in ms; hist: Anzahl je Zweierpotenz-Bucket in µs (Obergrenze)
+def latency_stats(latencies):
+    if not latencies:
+        return None
+    ordered = sorted(latencies)
+    hist = {}
+    for latency in ordered:
+        bucket = 2 ** (floor(log(max(latency * 1e6, 1), 2)) + 1)
+        hist[bucket] = hist.get(bucket, 0) + 1
+    return {
+        "n": len(ordered),
+        "mean": sum(ordered) * 1000 / len(ordered),
+        **{
+            f"p{q}": ordered[max(0, -(-q * len(ordered) // 100) - 1)] * 1000
+            for q in (50, 95, 99)
+        },
+        "max": ordered[-1] * 1000,
+        "hist": hist,
+    }
+
+
+# eine Anfrage des oid/vals-Mix ausführen, liefert (Form, Sekunden);
+# statements: Cache für prepare_query oder None für ad-hoc
+def timed_query(
     cursor,
+    i,
+    table_name,
+    num_tuples,
+    num_attributes,
+    oid_test_preference,
+    projection,
+    mode,
+    statements,
+    column_types=None,
+):
+    if oid_test_preference < 0:
+        shape = ("oid", "vals")[i % 2]
+    else:
+        shape = "oid" if random.random() < oid_test_preference else "vals"
+    if shape == "oid":
+        query, params = oid_query(
+            cursor, table_name, num_tuples, num_attributes, projection, mode
+        )
+    else:
+        query, params = vals_query(
+            cursor, table_name, num_attributes, projection, mode, column_types
+        )
+    if statements is not None:
+        query = prepare_query(cursor, query, len(params), statements)
+
+    t = time.perf_counter()
+    cursor.execute(query, params)
+    cursor.fetchall()
+    return shape, time.perf_counter() - t
+
+
+# Latenzmessung pro Anfrage (nur Ausführung + fetch, ohne Query-Bau und PREPARE);
+# prepared=True nutzt serverseitige Prepared Statements, warmup Anfragen werden verworfen
+def bench_latency(
+    cursor,
+    table_name,
     num_tuples,
-    sparsity,
     num_attributes,
-    indexing=False,
     num_queries=1000,
     oid_test_preference=0.5,
     max_time=5,
+    projection=None,
+    mode="table",
+    prepared=True,
+    warmup=50,
+    column_types=None,
 ):
-    phase1.generate_table(cursor, "h", num_tuples, sparsity, num_attributes)
-    h2v(cursor, "h", "v", indexing)
-    v2h(cursor, "v", "h_view")
+    statements = {}
+    latencies = {"oid": [], "vals": []}
+    start_time = None
+    try:
+        for i in range(warmup + num_queries):
+            if i == warmup:
+                start_time = time.perf_counter()
+            shape, t = timed_query(
+                cursor,
+                i,
+                table_name,
+                num_tuples,
+                num_attributes,
+                oid_test_preference,
+                projection,
+                mode,
+                statements if prepared else None,
+                column_types,
+            )
+            if start_time is not None:
+                latencies[shape].append(t)
+                if time.perf_counter() - start_time > max_time:
+                    break
+    finally:
+        if statements:
+            cursor.execute("DEALLOCATE ALL")
+
+    total = latencies["oid"] + latencies["vals"]
+    return {
+        "qps": len(total) / (time.perf_counter() - start_time) if total else 0,
+        "all": latency_stats(total),
+        "oid": latency_stats(latencies["oid"]),
+        "vals": latency_stats(latencies["vals"]),
+    }
 
+
+# prepared vs. ad hoc: Differenz der Mediane ~ Parse/Plan-Anteil einer Anfrage
+def bench_latency_compare(cursor, *args, **kwargs):
+    result = {
+        "prepared": bench_latency(cursor, *args, **kwargs, prepared=True),
+        "adhoc": bench_latency(cursor, *args, **kwargs, prepared=False),
+    }
+    result["planning"] = {
+        shape: result["adhoc"][shape]["p50"] - result["prepared"][shape]["p50"]
+        for shape in ("all", "oid", "vals")
+        if result["adhoc"][shape] and result["prepared"][shape]
+    }
+    return result
+
+
+# EXPLAIN (ANALYZE, BUFFERS) einer Anfrage, zusammengefasst auf Knotentypen,
+# Shared-Buffer-Treffer/-Lesezugriffe (kumuliert im Wurzelknoten) und Planungs-/Ausführungszeit
+def explain_query(cursor, query, params):
+    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    plan = plan[0]
+
+    nodes = []
+
+    def walk(node):
+        relation = node.get("Index Name") or node.get("Relation Name")
+        nodes.append(
+            f"{node['Node Type']} on {relation}" if relation else node["Node Type"]
+        )
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan["Plan"])
+    return {
+        "nodes": nodes,
+        "rows": plan["Plan"]["Actual Rows"],
+        "shared_hit": plan["Plan"].get("Shared Hit Blocks", 0),
+        "shared_read": plan["Plan"].get("Shared Read Blocks", 0),
+        "planning_ms": plan["Planning Time"],
+        "execution_ms": plan["Execution Time"],
+    }
+
+
+# Stichprobe von num_queries Plänen je Anfrageform, gleiche Signatur wie bench_table
+def bench_explain(
+    cursor,
+    table_name,
+    num_tuples,
+    num_attributes,
+    num_queries=1,
+    oid_test_preference=0.5,
+    max_time=5,
+    projection=None,
+    mode="table",
+    column_types=None,
+):
     return {
-        "h": bench_table(
+        "oid": [
+            explain_query(
+                cursor,
+                *oid_query(
+                    cursor, table_name, num_tuples, num_attributes, projection, mode
+                ),
+            )
+            for _ in range(num_queries)
+        ],
+        "vals": [
+            explain_query(
+                cursor,
+                *vals_query(
+                    cursor, table_name, num_attributes, projection, mode, column_types
+                ),
+            )
+            for _ in range(num_queries)
+        ],
+    }
+
+
+# Objekte pro Sekunde bei Batches von batch_size zufälligen oids, gleiche Signatur wie
+# bench_table (batch_size per partial); vertikale Modi pivotieren im Client (batch_lookup_v),
+# JSONB und Arrays lesen über ihre Sichten {j}_view/{a}_view
+def bench_batch(
+    cursor,
+    table_name,
+    num_tuples,
+    num_attributes,
+    num_queries=100,
+    oid_test_preference=0.5,
+    max_time=5,
+    projection=None,
+    mode="table",
+    batch_size=100,
+    column_types=None,  # nur für die gemeinsame Signatur, Batches ziehen nur oids
+):
+    batch_size = min(batch_size, num_tuples)
+    start_time = time.perf_counter()
+    i = 0
+    while i < num_queries:
+        i += 1
+        oids = random.sample(range(1, num_tuples + 1), batch_size)
+        if mode in ("pruned", "pushdown"):
+            batch_lookup_v(cursor, table_name, oids)
+        elif mode in ("jsonb", "array"):  # Spalten wie bei den übrigen Darstellungen
+            batch_lookup_h(cursor, f"{table_name}_view", oids)
+        else:
+            batch_lookup_h(cursor, table_name, oids)
+        if time.perf_counter() - start_time > max_time:
+            break
+    return i * batch_size / (time.perf_counter() - start_time)
+
+
+# Client-Cache je vertikaler Tabelle (colcache), bleibt über mehrere Messungen bestehen
+column_caches = {}
+
+
+# bench_oid/bench_vals aus dem spaltenorientierten Client-Cache über table_name (v),
+# gleiche Signatur wie bench_table; Segmente werden bei Bedarf nachgeladen (Fehltreffer)
+def bench_cache(
+    cursor,
+    table_name,
+    num_tuples,
+    num_attributes,
+    num_queries=1000,
+    oid_test_preference=0.5,
+    max_time=5,
+    projection=None,
+    mode="cache",
+    max_bytes=64 * 2**20,
+    column_types=None,
+):
+    if table_name not in column_caches:
+        column_caches[table_name] = colcache.create_cache(
+            cursor,
+            table_name,
+            get_v_columns(cursor, table_name),
+            get_v_types(cursor, table_name),
+            max_bytes,
+        )
+    cache = column_caches[table_name]
+    start_time = time.perf_counter()
+    i = 0
+    while i < num_queries:
+        i += 1
+        columns = pick_columns(num_attributes, projection)
+        if random.random() < oid_test_preference:
+            colcache.cache_get(cursor, cache, random.randint(1, num_tuples), columns)
+        else:
+            colcache.cache_find(
+                cursor, cache, *random_predicate(num_attributes, column_types), columns
+            )
+        if time.perf_counter() - start_time > max_time:
+            break
+    return i / (time.perf_counter() - start_time)
+
+
+# ein Lastclient mit eigener Verbindung: Anfragen für duration Sekunden, liefert Latenzen
+def load_client(
+    table_name,
+    num_tuples,
+    num_attributes,
+    duration,
+    oid_test_preference,
+    projection,
+    mode,
+    prepared,
+    column_types=None,
+):
+    client_conn = phase1.connect()
+    client_cursor = client_conn.cursor()
+    statements = {} if prepared else None
+    latencies = []
+    try:
+        end_time = time.perf_counter() + duration
+        i = 0
+        while time.perf_counter() < end_time:
+            latencies.append(
+                timed_query(
+                    client_cursor,
+                    i,
+                    table_name,
+                    num_tuples,
+                    num_attributes,
+                    oid_test_preference,
+                    projection,
+                    mode,
+                    statements,
+                    column_types,
+                )[1]
+            )
+            i += 1
+    finally:
+        client_conn.close()
+    return latencies
+
+
+# Skalierungskurve: je Anzahl gleichzeitiger Clients Gesamtdurchsatz und Latenzen
+# pool: "thread" (psycopg2 gibt das GIL während der Anfrage frei) oder "process"
+def load_curve(
+    table_name,
+    num_tuples,
+    num_attributes,
+    clients=(1, 2, 4, 8, 16, 32, 64),
+    duration=5,
+    oid_test_preference=0.5,
+    projection=None,
+    mode="table",
+    prepared=True,
+    pool="thread",
+    column_types=None,
+):
+    executor = ThreadPoolExecutor if pool == "thread" else ProcessPoolExecutor
+    curve = []
+    for num_clients in clients:
+        with executor(num_clients) as workers:
+            futures = [
+                workers.submit(
+                    load_client,
+                    table_name,
+                    num_tuples,
+                    num_attributes,
+                    duration,
+                    oid_test_preference,
+                    projection,
+                    mode,
+                    prepared,
+                    column_types,
+                )
+                for _ in range(num_clients)
+            ]
+            latencies = [latency for f in futures for latency in f.result()]
+        curve.append(
+            {
+                "clients": num_clients,
+                "qps": len(latencies) / duration,
+                **latency_stats(latencies),
+            }
+        )
+        print(
+            f"{table_name}: {num_clients} clients, {curve[-1]['qps']:.0f} q/s, p99={curve[-1]['p99']:.3}ms"
+        )
+    return curve
+
+
+# Lastkurven für h und alle Darstellungen, gespeichert in load_results.json
+def load_benchmark(
+    num_tuples,
+    sparsity,
+    num_attributes,
+    indexing=False,
+    clients=(1, 2, 4, 8, 16, 32, 64),
+    duration=5,
+    oid_test_preference=0.5,
+    projection=None,
+    prepared=True,
+    pool="thread",
+    gen_method="copy",
+    gen_batch_size=None,
+    column_types=None,
+):
+    tables = build_layouts(
+        cursor,
+        num_tuples,
+        sparsity,
+        num_attributes,
+        indexing,
+        gen_method=gen_method,
+        gen_batch_size=gen_batch_size,
+        column_types=column_types,
+    )
+    results = {
+        key: load_curve(
+            table_name,
+            num_tuples,
+            num_attributes,
+            clients,
+            duration,
+            oid_test_preference,
+            projection,
+            mode,
+            prepared,
+            pool,
+            column_types,
+        )
+        for key, (table_name, mode) in tables.items()
+    }
+    with open("load_results.json", "w") as file:
+        json.dump(results, file, indent=4)
+    return results
+
+
+# v2h-Varianten für bench_compare: method -> (Ergebnisschlüssel, Sichtname);
+# ohne Sicht wird die vertikale Tabelle mit dem Query-Builder des Modus method abgefragt
+v2h_views = {
+    "join": ("v", "h_view"),
+    "agg": ("v_agg", "h_view_agg"),
+    "pruned": ("v_pruned", None),
+    "pushdown": ("v_pushdown", None),
+}
+
+
+# erzeugt h und alle Darstellungen, liefert Ergebnisschlüssel -> (Tabelle/Sicht, mode)
+def build_layouts(
+    cursor,
+    num_tuples,
+    sparsity,
+    num_attributes,
+    indexing=False,
+    v2h_methods=("join", "agg", "pruned", "pushdown"),
+    partitioned=True,
+    sparsity_sample=None,  # Prozent für eine Stichproben-Prüfung der Sparsity von h
+    client_memory=None,  # dict für Client-Spitzenspeicher je Schritt (storage.traced)
+    hybrid=True,
+    jsonb=True,
+    jsonb_hot_keys=(),
+    array=True,
+    materialized=True,
+    gen_method="copy",  # Erzeugung von h (phase1.generate_table)
+    gen_batch_size=None,
+    column_types=None,
+):
+    with storage.traced(client_memory, "generate"):
+        phase1.generate_table(
+            cursor,
+            "h",
+            num_tuples,
+            sparsity,
+            num_attributes,
+            gen_method,
+            gen_batch_size,
+            column_types=column_types,
+        )
+    if sparsity_sample:
+        phase1.test_sparsity(
             cursor,
             "h",
+            phase1.mean_sparsity(sparsity, num_attributes),
+            num_attributes,
+            sparsity_sample,
+        )
+    with storage.traced(client_memory, "h2v"):
+        h2v(cursor, "h", "v", indexing)
+    tables = {"h": ("h", "table")}
+    for method in v2h_methods:
+        key, view = v2h_views[method]
+        if view is None:
+            tables[key] = ("v", method)
+        else:
+            v2h(cursor, "v", view, method)
+            make_writable(cursor, "v", view)
+            tables[key] = (view, "table")
+    if partitioned:  # dritte Darstellung: nativ nach Attribut partitioniert
+        with storage.traced(client_memory, "h2v_vp"):
+            h2v(cursor, "h", "vp", indexing, partitioned=True)
+        v2h(cursor, "vp", "h_view_part")
+        make_writable(cursor, "vp", "h_view_part")
+        tables["vp"] = ("h_view_part", "table")
+    if hybrid:  # dichte Spalten horizontal, dünne vertikal
+        with storage.traced(client_memory, "h2hybrid"):
+            h2hybrid(cursor, "h", "hy", indexing=indexing)
+        tables["hy"] = ("hy_view", "table")
+    if jsonb:  # ein JSONB-Dokument pro oid
+        with storage.traced(client_memory, "h2jsonb"):
+            h2jsonb(cursor, "h", "j", indexing, jsonb_hot_keys)
+        tables["j"] = ("j", "jsonb")
+    if array:  # eine Zeile pro oid mit parallelen Schlüssel-/Wert-Arrays
+        with storage.traced(client_memory, "h2array"):
+            h2array(cursor, "h", "arr", indexing)
+        tables["arr"] = ("arr", "array")
+    if materialized:  # h_view als Tabelle, per Trigger aus v nachgeführt
+        with storage.traced(client_memory, "materialize_v2h"):
+            materialize_v2h(cursor, "v", "h_mat")
+        tables["hm"] = ("h_mat", "table")
+    return tables
+
+
+# bench: bench_table (Durchsatz), bench_latency oder bench_latency_compare
+def bench_layouts(
+    cursor,
+    tables,
+    num_tuples,
+    num_attributes,
+    num_queries=1000,
+    oid_test_preference=0.5,
+    max_time=5,
+    projection=None,
+    bench=bench_table,
+    column_types=None,
+):
+    return {
+        key: bench(
+            cursor,
+            table_name,
             num_tuples,
             num_attributes,
             num_queries,
             oid_test_preference,
             max_time,
-        ),
-        "v": bench_table(
+            projection,
+            mode,
+            column_types=column_types,
+        )
+        for key, (table_name, mode) in tables.items()
+    }
+
+
+def bench_compare(
+    cursor,
+    num_tuples,
+    sparsity,
+    num_attributes,
+    indexing=False,
+    num_queries=1000,
+    oid_test_preference=0.5,
+    max_time=5,
+    v2h_methods=("join", "agg", "pruned", "pushdown"),
+    projection=None,
+    partitioned=True,
+    sparsity_sample=None,
+    bench=bench_table,
+    cache_bytes=None,  # Größe des Client-Caches über v als weiterer Kandidat (None = ohne)
+    gen_method="copy",
+    gen_batch_size=None,
+    column_types=None,
+):
+    tables = build_layouts(
+        cursor,
+        num_tuples,
+        sparsity,
+        num_attributes,
+        indexing,
+        v2h_methods,
+        partitioned,
+        sparsity_sample,
+        gen_method=gen_method,
+        gen_batch_size=gen_batch_size,
+        column_types=column_types,
+    )
+    result = bench_layouts(
+        cursor,
+        tables,
+        num_tuples,
+        num_attributes,
+        num_queries,
+        oid_test_preference,
+        max_time,
+        projection,
+        bench,
+        column_types,
+    )
+    if cache_bytes:
+        column_caches.pop("v", None)  # v wurde neu erzeugt
+        result["cache"] = bench_cache(
             cursor,
-            "h_view",
+            "v",
             num_tuples,
             num_attributes,
             num_queries,
             oid_test_preference,
             max_time,
-        ),
-    }
+            projection,
+            max_bytes=cache_bytes,
+            column_types=column_types,
+        )
+        result["cache_hit_rate"] = colcache.hit_rate(column_caches["v"])
+    return result
+
+
+# Größe inklusive aller Partitionen (pg_total_relation_size ist für die Elterntabelle 0)
+def relation_size(cursor, table_names):
+    cursor.execute(
+        f"""
+        SELECT SUM(pg_total_relation_size(relid)) FROM (
+            {" UNION ALL ".join(
+                f"SELECT relid FROM pg_partition_tree('{t}')" for t in table_names
+            )}
+        ) AS p"""
+    )
+    return int(cursor.fetchone()[0])
+
+
+def v_table_size(cursor, v_table_name):
+    return relation_size(
+        cursor, storage.v_layout_tables(v_table_name, get_v_types(cursor, v_table_name))
+    )
 
 
 def normalized_diff(a, b):
     return floor((a - b) * 10000 / (a + b)) / 100
 
 
+# eine Zelle des Parameter-Gitters: erzeugen, umwandeln, messen -> Ergebniszeile
+def bench_cell(
+    cursor,
+    indexing,
+    tuple_factor,
+    sparsity_factor,
+    num_attributes,
+    num_queries=10,
+    oid_test_preference=0.5,
+    max_time=10,
+    projection=None,
+    partitioned=True,
+    latency=False,
+    explain=0,
+    profile_storage=False,
+    hybrid=True,
+    jsonb=True,
+    jsonb_hot_keys=(),
+    array=True,
+    batch_sizes=(),
+    write_preference=0,
+    materialized=True,
+    range_width=None,
+    workload=None,  # Argumente für workload.make_workload (None = bench_oid/bench_vals)
+    dense_columns=0,
+    dense_sparsity=0.1,
+    gen_method="copy",
+    gen_batch_size=None,
+    column_types=None,
+    sparsity_sample=None,
+):
+    t = floor(2**tuple_factor)
+    s = 1 - 0.5**sparsity_factor
+    # die ersten dense_columns Attribute dicht, damit h2hybrid wirklich aufteilt
+    column_sparsities = [dense_sparsity] * min(dense_columns, num_attributes) + [s] * (
+        num_attributes - min(dense_columns, num_attributes)
+    )
+
+    client_memory = {} if profile_storage else None
+    tables = build_layouts(
+        cursor,
+        t,
+        column_sparsities if dense_columns else s,
+        num_attributes,
+        indexing,
+        partitioned=partitioned,
+        sparsity_sample=sparsity_sample,
+        client_memory=client_memory,
+        hybrid=hybrid,
+        jsonb=jsonb,
+        jsonb_hot_keys=jsonb_hot_keys,
+        array=array,
+        materialized=materialized,
+        gen_method=gen_method,
+        gen_batch_size=gen_batch_size,
+        column_types=column_types,
+    )
+    bench = bench_table
+    # gleiches Zugriffsmuster (inkl. Stichprobe) für alle Darstellungen
+    if workload is not None:
+        bench = partial(
+            bench_table,
+            workload=workloads.make_workload(
+                cursor, "h", t, num_attributes, **workload
+            ),
+        )
+    result = bench_layouts(
+        cursor,
+        tables,
+        t,
+        num_attributes,
+        num_queries,
+        oid_test_preference,
+        max_time,
+        projection,
+        bench,
+        column_types=column_types,
+    )
+    cursor.execute("SELECT pg_total_relation_size('h')")
+    memory_h = cursor.fetchall()[0][0]
+    memory_v = v_table_size(cursor, "v")
+    memory = {"m_h": memory_h, "m_v": memory_v}
+    if partitioned:
+        memory["m_vp"] = v_table_size(cursor, "vp")
+    if hybrid:
+        memory["m_hy"] = relation_size(cursor, hybrid_tables(cursor, "hy"))
+    if jsonb:
+        memory["m_j"] = relation_size(cursor, ["j"])
+    if array:
+        memory["m_arr"] = relation_size(cursor, ["arr", "arr_col"])
+    if materialized:
+        memory["m_hm"] = relation_size(cursor, ["h_mat"])
+
+    row = {
+        "tf": tuple_factor,
+        "t": t,
+        "sf": sparsity_factor,
+        "s": s,
+        "dense": dense_columns,
+        "a": num_attributes,
+        "i": indexing,
+        "gen": gen_method,
+        "types": list(column_types or phase1.column_types),
+        "hot": list(jsonb_hot_keys),
+        **{f"p_{k}": floor(p) for k, p in result.items()},
+        **memory,
+        "pdf": normalized_diff(result["h"], result["v"]),
+        "mdf": normalized_diff(memory_h, memory_v),
+        # weitere Varianten ebenfalls relativ zu h
+        **{
+            f"pdf_{k}": normalized_diff(result["h"], p)
+            for k, p in result.items()
+            if k not in ("h", "v")
+        },
+    }
+    if latency:
+        row["lat"] = bench_layouts(
+            cursor,
+            tables,
+            t,
+            num_attributes,
+            num_queries,
+            oid_test_preference,
+            max_time,
+            projection,
+            bench_latency_compare,
+            column_types=column_types,
+        )
+    if profile_storage:
+        layouts = {
+            "h": ["h"],
+            "v": storage.v_layout_tables("v", get_v_types(cursor, "v")),
+        }
+        if partitioned:
+            layouts["vp"] = storage.v_layout_tables("vp", get_v_types(cursor, "vp"))
+        if hybrid:
+            layouts["hy"] = hybrid_tables(cursor, "hy")
+        if jsonb:
+            layouts["j"] = ["j"]
+        if array:
+            layouts["arr"] = ["arr", "arr_col"]
+        if materialized:
+            layouts["hm"] = ["h_mat"]
+        row["storage"] = storage.layout_footprint(
+            cursor, layouts, storage.ensure_pgstattuple(cursor)
+        )
+        row["client_mem"] = client_memory
+    if batch_sizes:  # Objekte/s je Batchgröße und Darstellung
+        row["batch"] = {
+            batch_size: bench_layouts(
+                cursor,
+                tables,
+                t,
+                num_attributes,
+                num_queries,
+                oid_test_preference,
+                max_time,
+                projection,
+                partial(bench_batch, batch_size=batch_size),
+                column_types=column_types,
+            )
+            for batch_size in batch_sizes
+        }
+    if explain:
+        row["plans"] = bench_layouts(
+            cursor,
+            tables,
+            t,
+            num_attributes,
+            explain,
+            oid_test_preference,
+            max_time,
+            projection,
+            bench_explain,
+            column_types=column_types,
+        )
+    if range_width:  # nur Bereichsscans über range_width des Wertebereichs
+        row["range"] = bench_layouts(
+            cursor,
+            tables,
+            t,
+            num_attributes,
+            num_queries,
+            0,
+            max_time,
+            projection,
+            partial(bench_table, range_preference=1, range_width=range_width),
+            column_types=column_types,
+        )
+    if write_preference:  # zuletzt, da die Schreibzugriffe h und v verändern
+        bench_write_mix = partial(
+            bench_table, write_preference=write_preference, sparsity=column_sparsities
+        )
+        if materialized:  # Vergleichswerte ohne Nachführung von h_mat
+            set_materialized_sync(cursor, "v", "h_mat", False)
+        row["write"] = bench_layouts(
+            cursor,
+            {
+                k: tables[k]
+                for k in ("h", "v", "v_agg", "vp")
+                if k in tables and tables[k][1] == "table"
+            },
+            t,
+            num_attributes,
+            num_queries,
+            oid_test_preference,
+            max_time,
+            projection,
+            bench_write_mix,
+            column_types=column_types,
+        )
+        if materialized:
+            refresh_materialized(cursor, "v", "h_mat")
+            set_materialized_sync(cursor, "v", "h_mat", True)
+        if materialized and "v" in tables:
+            # dieselbe Last über h_view, jetzt mit Triggern auf v -> Schreibverstärkung
+            row["write"]["hm"] = bench_layouts(
+                cursor,
+                {"hm": tables["v"]},
+                t,
+                num_attributes,
+                num_queries,
+                oid_test_preference,
+                max_time,
+                projection,
+                bench_write_mix,
+                column_types=column_types,
+            )["hm"]
+            row["write_amp"] = row["write"]["v"] / row["write"]["hm"]
+    print(f"mem_rating_diff: {row["mdf"]}; perf_rating_diff: {row["pdf"]}")
+    return row
+
+
+# Worker-Prozesse: eigene Verbindung und eigenes Schema, damit h/v nicht kollidieren
+worker_schema_prefix = "bench_w"
+worker_cursor = None
+
+
+def init_bench_worker():
+    global worker_cursor
+    worker_conn = phase1.connect()
+    worker_cursor = worker_conn.cursor()
+    schema = f"{worker_schema_prefix}{os.getpid()}"
+    worker_cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+    worker_cursor.execute(f"SET search_path TO {schema}")
+    worker_conn.commit()
+
+
+def bench_cell_worker(cell, options):
+    return bench_cell(worker_cursor, *cell, **options)
+
+
+def cell_key(row):
+    return (row["i"], row["tf"], row["sf"], row["a"])
+
+
+def load_results(file_name="results.json"):
+    if not os.path.exists(file_name):
+        return []
+    with open(file_name) as file:
+        return json.load(file)["perf"]
+
+
+def save_results(results, file_name="results.json"):
+    with open(file_name, "w") as file:
+        perf_results = sorted(results, key=lambda x: x["pdf"])
+        mem_results = sorted(results, key=lambda x: x["mdf"])
+        json.dump({"perf": perf_results, "mem": mem_results}, file, indent=4)
+
+
+# workers > 1: Gitterzellen parallel in einem Prozesspool (je Prozess ein Schema);
+# resume: Zellen aus einem vorhandenen results.json überspringen und ergänzen.
+# Nach jeder Zelle wird gespeichert, ein abgebrochener Lauf kann also fortgesetzt werden.
 def benchmark(
     t_range=range(10, 16, 2),  # base 2
     s_range=range(2, 8, 4),  # base 0.5
@@ -266,72 +2342,103 @@ def benchmark(
     num_queries=10,
     oid_test_preference=0.5,
     max_time=10,
+    projection=None,
+    partitioned=True,
+    i_range=(False, True),  # False, True oder Namen aus index_profiles
+    latency=False,  # zusätzlich Latenzen prepared vs. ad hoc je Darstellung ("lat")
+    workers=1,
+    resume=False,
+    explain=0,  # Anzahl EXPLAIN-ANALYZE-Stichproben je Anfrageform und Darstellung ("plans")
+    profile_storage=False,  # Heap/Index/TOAST/Bloat je Relation und Client-Speicher
+    hybrid=True,
+    jsonb=True,
+    jsonb_hot_keys=(),  # z.B. ("a1", "a2"): Ausdrucksindizes auf j für diese Attribute
+    array=True,
+    batch_sizes=(),  # z.B. (1, 10, 100, 1000): Batch-Lookups je Größe ("batch")
+    write_preference=0,  # Anteil Schreibzugriffe für den gemischten Durchsatz ("write")
+    materialized=True,
+    range_width=None,  # z.B. 0.01: Bereichsscans je Darstellung ("range")
+    workload=None,  # z.B. {"distribution": "zipf", "mix": {"oid": 0.5, "value": 0.3, "range": 0.2}}
+    dense_columns=0,  # Anzahl Attribute mit dense_sparsity statt s (gemischte Dichte für hy)
+    dense_sparsity=0.1,
+    gen_method="copy",  # Erzeugung von h: "copy", "insert" oder "server"
+    gen_batch_size=None,
+    column_types=None,  # z.B. ("str", "int", "dat", "num"), None = phase1.column_types
+    sparsity_sample=None,  # Prozent: Sparsity von h je Zelle per Stichprobe prüfen
 ):
     start_time = time.perf_counter()
-    results = []
-
-    for indexing in False, True:
-        for tuple_factor in t_range:
-            for sparsity_factor in s_range:
-                for num_attributes in a_range:
-                    t = floor(2**tuple_factor)
-                    s = 1 - 0.5**sparsity_factor
-
-                    result = bench_compare(
-                        cursor,
-                        t,
-                        s,
-                        num_attributes,
-                        indexing,
-                        num_queries,
-                        oid_test_preference,
-                        max_time,
-                    )
-                    cursor.execute("SELECT pg_total_relation_size('h')")
-                    memory_h = cursor.fetchall()[0][0]
-                    cursor.execute(
-                        f"SELECT {' + '.join(
-                            [f"pg_total_relation_size('v_{s}')" for s in ('str','int','null')]
-                        )}"
-                    )
-                    memory_v = cursor.fetchall()[0][0]
-
-                    results.append(
-                        {
-                            "tf": tuple_factor,
-                            "t": t,
-                            "sf": sparsity_factor,
-                            "s": s,
-                            "a": num_attributes,
-                            "i": indexing,
-                            "p_h": floor(result["h"]),
-                            "p_v": floor(result["v"]),
-                            "m_h": memory_h,
-                            "m_v": memory_v,
-                            "pdf": normalized_diff(result["h"], result["v"]),
-                            "mdf": normalized_diff(memory_h, memory_v),
-                        }
-                    )
-                    print(
-                        f"mem_rating_diff: {results[-1]["mdf"]}; perf_rating_diff: {results[-1]["pdf"]}"
-                    )
-
-    with open("results.json", "w") as file:
-        perf_results = sorted(results, key=lambda x: x["pdf"])
-        mem_results = sorted(results, key=lambda x: x["mdf"])
-        json.dump({"perf": perf_results, "mem": mem_results}, file, indent=4)
+    results = load_results() if resume else []
+    done = {cell_key(row) for row in results}
+
+    options = dict(
+        num_queries=num_queries,
+        oid_test_preference=oid_test_preference,
+        max_time=max_time,
+        projection=projection,
+        partitioned=partitioned,
+        latency=latency,
+        explain=explain,
+        profile_storage=profile_storage,
+        hybrid=hybrid,
+        jsonb=jsonb,
+        jsonb_hot_keys=jsonb_hot_keys,
+        array=array,
+        batch_sizes=batch_sizes,
+        write_preference=write_preference,
+        materialized=materialized,
+        range_width=range_width,
+        workload=workload,
+        dense_columns=dense_columns,
+        dense_sparsity=dense_sparsity,
+        gen_method=gen_method,
+        gen_batch_size=gen_batch_size,
+        column_types=column_types,
+        sparsity_sample=sparsity_sample,
+    )
+    cells = [
+        (indexing, tuple_factor, sparsity_factor, num_attributes)
+        for indexing in i_range
+        for tuple_factor in t_range
+        for sparsity_factor in s_range
+        for num_attributes in a_range
+        if (indexing, tuple_factor, sparsity_factor, num_attributes) not in done
+    ]
+
+    if workers <= 1:
+        for cell in cells:
+            results.append(bench_cell(cursor, *cell, **options))
+            save_results(results)
+    else:
+        if (
+            profile_storage
+        ):  # einmal vorab, sonst konkurrieren die Worker um CREATE EXTENSION
+            storage.ensure_pgstattuple(cursor)
+        with ProcessPoolExecutor(workers, initializer=init_bench_worker) as pool:
+            futures = [pool.submit(bench_cell_worker, cell, options) for cell in cells]
+            for future in as_completed(futures):
+                results.append(future.result())
+                save_results(results)
+        cursor.execute(
+            f"SELECT nspname FROM pg_namespace WHERE nspname LIKE '{worker_schema_prefix}%'"
+        )
+        for [schema] in cursor.fetchall():
+            cursor.execute(f"DROP SCHEMA {schema} CASCADE")
+        conn.commit()
+
+    save_results(results)
 
     print(
         f"Results saved to results.json in {time.perf_counter() - start_time}s, used {time.process_time()} CPU seconds"
     )
 
 
-# phase1.allowed_strings = ['a', 'b', 'c', 'd', 'e']
-benchmark(
-    t_range=range(10, 17, 2),
-    s_range=range(2, 22, 3),
-    a_range=range(5, 11, 4),
-    num_queries=100,
-    oid_test_preference=0.5,
-    max_time=100,
-)
+if __name__ == "__main__":
+    # phase1.allowed_strings = ['a', 'b', 'c', 'd', 'e']
+    benchmark(
+        t_range=range(10, 17, 2),
+        s_range=range(2, 22, 3),
+        a_range=range(5, 11, 4),
+        num_queries=100,
+        oid_test_preference=0.5,
+        max_time=100,
+    )
@@ -0,0 +1,97 @@
+import psycopg2
+import tracemalloc
+from contextlib import contextmanager
+
+# Speicherprofil pro Darstellung: Heap, Indizes, TOAST, FSM/VM und (mit pgstattuple)
+# freier Platz bzw. tote Tupel pro Relation, plus Client-Spitzenverbrauch per tracemalloc
+
+
+# fest in public statt in current_schema() (bei Workern deren bench_w-Schema, das am Ende
+# gelöscht wird); liefert das Schema der Extension bzw. None, wenn sie nicht verfügbar ist
+def ensure_pgstattuple(cursor):
+    try:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pgstattuple SCHEMA public")
+        cursor.execute(
+            """
+            SELECT n.nspname FROM pg_extension AS e
+            JOIN pg_namespace AS n ON n.oid = e.extnamespace
+            WHERE e.extname = 'pgstattuple'
+        """
+        )
+        schema = cursor.fetchone()[0]
+        cursor.connection.commit()
+        return schema
+    except psycopg2.Error:
+        cursor.connection.rollback()
+        return None
+
+
+# alle Blatt-Relationen (bei partitionierten Tabellen die Partitionen);
+# pgstattuple_schema: Schema der Extension aus ensure_pgstattuple (None = ohne pgstattuple)
+def relation_footprint(cursor, table_name, pgstattuple_schema=None):
+    cursor.execute(
+        f"""
+        SELECT
+            c.relname,
+            pg_relation_size(c.oid, 'main'),
+            pg_indexes_size(c.oid),
+            COALESCE(pg_total_relation_size(NULLIF(c.reltoastrelid, 0)), 0),
+            pg_relation_size(c.oid, 'fsm') + pg_relation_size(c.oid, 'vm')
+        FROM pg_partition_tree('{table_name}') AS p
+        JOIN pg_class AS c ON c.oid = p.relid
+        WHERE p.isleaf
+    """
+    )
+    footprint = {
+        name: {"heap": heap, "index": index, "toast": toast, "maps": maps}
+        for name, heap, index, toast, maps in cursor.fetchall()
+    }
+    if pgstattuple_schema:
+        for name, sizes in footprint.items():
+            cursor.execute(
+                f"SELECT tuple_len, dead_tuple_len, free_space FROM {pgstattuple_schema}.pgstattuple('{name}')"
+            )
+            live, dead, free = cursor.fetchone()
+            sizes.update({"live": live, "dead": dead, "free": free})
+    return footprint
+
+
+def sum_sizes(footprints):
+    total = {}
+    for sizes in footprints.values():
+        for key, size in sizes.items():
+            total[key] = total.get(key, 0) + size
+    total["total"] = sum(
+        total.get(key, 0) for key in ("heap", "index", "toast", "maps")
+    )
+    return total
+
+
+# layouts: Name -> Liste der Tabellen der Darstellung
+def layout_footprint(cursor, layouts, pgstattuple_schema=None):
+    result = {}
+    for layout, table_names in layouts.items():
+        relations = {}
+        for table_name in table_names:
+            relations.update(relation_footprint(cursor, table_name, pgstattuple_schema))
+        result[layout] = {"relations": relations, "sum": sum_sizes(relations)}
+    return result
+
+
+# types: Typen der Wertetabellen (phase2.get_v_types)
+def v_layout_tables(v_table_name, types=("str", "int")):
+    return [f"{v_table_name}_{s}" for s in (*types, "null", "col")]
+
+
+# Spitzenverbrauch an Python-Speicher im Block unter peaks[name] (peaks=None: nicht messen)
+@contextmanager
+def traced(peaks, name):
+    if peaks is None:
+        yield
+        return
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        peaks[name] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
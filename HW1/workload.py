@@ -0,0 +1,112 @@
+import random
+from bisect import bisect_left
+from itertools import accumulate
+
+# Zugriffsmuster für die Benchmarks: oid-Verteilungen (gleichverteilt, Zipf, Hotspot),
+# Wertsuchen mit tatsächlich vorhandenen Werten, oid-Bereichsscans und Projektionen.
+# make_workload liefert ein dict aus Ziehfunktionen, phase2.workload_query baut daraus
+# die Anfragen (bench_table(..., workload=...)).
+
+
+# oids in zufälliger Reihenfolge, damit heiße oids nicht nebeneinander auf einer Seite liegen
+def shuffled_oids(num_tuples):
+    oids = list(range(1, num_tuples + 1))
+    random.shuffle(oids)
+    return oids
+
+
+def uniform_oid(num_tuples):
+    return lambda: random.randint(1, num_tuples)
+
+
+# Rang r mit Wahrscheinlichkeit ~ 1 / r^s
+def zipf_oid(num_tuples, s=1.0):
+    oids = shuffled_oids(num_tuples)
+    cumulative = list(accumulate(1 / r**s for r in range(1, num_tuples + 1)))
+    total = cumulative[-1]
+    return lambda: oids[
+        min(bisect_left(cumulative, random.random() * total), num_tuples - 1)
+    ]
+
+
+# hot_share der Zugriffe auf hot_fraction der oids, der Rest gleichverteilt auf alle übrigen
+def hotspot_oid(num_tuples, hot_fraction=0.1, hot_share=0.9):
+    oids = shuffled_oids(num_tuples)
+    hot = max(1, round(num_tuples * hot_fraction))
+
+    def next_oid():
+        if random.random() < hot_share or hot == num_tuples:
+            return oids[random.randrange(hot)]
+        return oids[random.randrange(hot, num_tuples)]
+
+    return next_oid
+
+
+oid_distributions = {"uniform": uniform_oid, "zipf": zipf_oid, "hotspot": hotspot_oid}
+
+
+# Stichprobe vorhandener Nicht-NULL-Werte je Spalte (Zeilenstichprobe, häufige Werte
+# kommen also entsprechend oft vor); Spalten ohne Werte fehlen im Ergebnis
+def sample_values(cursor, table_name, columns, sample_size=1000):
+    values = {}
+    for column in columns:
+        cursor.execute(
+            f"SELECT {column} FROM {table_name} WHERE {column} IS NOT NULL ORDER BY random() LIMIT %s",
+            (sample_size,),
+        )
+        sample = [value for [value] in cursor.fetchall()]
+        if sample:
+            values[column] = sample
+    return values
+
+
+# table_name: horizontale Quelltabelle für die Wertstichprobe (alle Darstellungen enthalten
+# dieselben Daten); mix: Anteile der Anfragearten "oid", "value" und "range";
+# range_size: oids je Bereichsscan; projection: Anzahl zufälliger Spalten (None = alle)
+def make_workload(
+    cursor,
+    table_name,
+    num_tuples,
+    num_attributes,
+    distribution="uniform",
+    distribution_args=None,
+    mix=None,
+    range_size=100,
+    projection=None,
+    sample_size=1000,
+):
+    next_oid = oid_distributions[distribution](num_tuples, **(distribution_args or {}))
+    mix = mix or {"oid": 0.5, "value": 0.5}
+    values = {}
+    if mix.get("value"):
+        values = sample_values(
+            cursor,
+            table_name,
+            [f"a{i}" for i in range(1, num_attributes + 1)],
+            sample_size,
+        )
+
+    def next_value():
+        column = random.choice(list(values))
+        return column, random.choice(values[column])
+
+    def next_range():
+        lo = min(next_oid(), max(1, num_tuples - range_size + 1))
+        return lo, lo + range_size - 1
+
+    kinds = [
+        kind for kind, share in mix.items() if share and (kind != "value" or values)
+    ]
+    return {
+        "kinds": kinds,
+        "weights": [mix[kind] for kind in kinds],
+        "oid": next_oid,
+        "value": next_value,
+        "range": next_range,
+        "num_attributes": num_attributes,
+        "projection": projection,
+    }
+
+
+def next_kind(workload):
+    return random.choices(workload["kinds"], workload["weights"])[0]